@@ -33,12 +33,26 @@ def create_app():
 
     # Import models so SQLAlchemy knows about them
     from . import models
+    # and the flush hooks that keep album aggregates and tag counts current
+    from . import aggregates, tags
 
     # Register blueprints
     from .routes import main
     from .auth import auth as auth_blueprint
+    from .resumable import resumable
     app.register_blueprint(main)
     app.register_blueprint(auth_blueprint)
+    app.register_blueprint(resumable)
+
+    from .cli import register_commands
+    register_commands(app)
+
+    from . import database, jobs, delivery, cache, metrics
+    database.init_app(app)
+    jobs.init_app(app)
+    delivery.init_app(app)
+    cache.init_app(app)
+    metrics.init_app(app)
 
     return app
 
@@ -0,0 +1,100 @@
+"""Per-album photo and video counts and cover thumbnails, precomputed.
+
+The albums page shows each album's counts and newest few files. Deriving
+them on every view meant reading every photo in every album. Instead,
+album.photo_count, video_count, cover_filenames and updated_at are
+stored, and an after_flush hook refreshes them for exactly the albums a
+flush touched: ones a photo was added to, removed from or deleted out of,
+and ones whose photos changed name, type or upload time (HEIC conversion
+renames a file, for instance). The refresh runs in the same transaction.
+It reads only those albums' rows through ix_photo_album_upload, so the
+albums page costs one row per album however large the library is.
+
+Like the search index, it relies on the ORM. Bulk Query.update() or
+delete() on photos would bypass it; rebuild() recomputes every album.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from .models import db, Album, Photo
+
+COVER_COUNT = 5
+# photo attributes the aggregates depend on
+AGGREGATE_FIELDS = ("album_id", "filename", "media_type", "upload_time")
+
+
+def refresh(connection, album_ids) -> None:
+    """Recompute the aggregates of the given albums from the photo table."""
+    album_ids = {aid for aid in album_ids if aid is not None}
+    if not album_ids:
+        return
+    counts = {aid: {"image": 0, "video": 0} for aid in album_ids}
+    for album_id, media_type, n in connection.execute(
+        db.select(Photo.album_id, Photo.media_type, db.func.count())
+        .where(Photo.album_id.in_(album_ids))
+        .group_by(Photo.album_id, Photo.media_type)
+    ):
+        counts[album_id][media_type] = n
+
+    ranked = db.select(
+        Photo.album_id, Photo.filename,
+        db.func.row_number().over(
+            partition_by=Photo.album_id,
+            order_by=(Photo.upload_time.desc(), Photo.id.desc())
+        ).label("n")
+    ).where(Photo.album_id.in_(album_ids)).subquery()
+    covers = {aid: [] for aid in album_ids}
+    for album_id, filename in connection.execute(
+        db.select(ranked.c.album_id, ranked.c.filename)
+        .where(ranked.c.n <= COVER_COUNT)
+        .order_by(ranked.c.album_id, ranked.c.n)
+    ):
+        covers[album_id].append(filename)
+
+    now = datetime.utcnow()
+    album = Album.__table__
+    connection.execute(
+        album.update().where(album.c.id == db.bindparam("album_id")).values(
+            photo_count=db.bindparam("photos"),
+            video_count=db.bindparam("videos"),
+            cover_filenames=db.bindparam("covers", type_=db.JSON),
+            updated_at=now,
+        ),
+        [
+            {"album_id": aid, "photos": counts[aid]["image"], "videos": counts[aid]["video"],
+             "covers": covers[aid]}
+            for aid in album_ids
+        ],
+    )
+
+
+def rebuild() -> int:
+    """Recompute every album; returns the number of albums."""
+    album_ids = [aid for (aid,) in db.session.query(Album.id)]
+    refresh(db.session.connection(), album_ids)
+    db.session.commit()
+    return len(album_ids)
+
+
+def _touched_albums(session) -> set:
+    album_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Photo):
+            state = inspect(obj)
+            if obj in session.dirty and not any(
+                state.attrs[field].history.has_changes() for field in AGGREGATE_FIELDS
+            ):
+                continue
+            # both the album it left and the one it joined
+            album_ids.update(state.attrs.album_id.history.sum())
+            album_ids.update(a.id for a in state.attrs.album.history.sum() if a is not None)
+        elif isinstance(obj, Album) and obj in session.new:
+            album_ids.add(obj.id)
+    return album_ids
+
+
+@event.listens_for(db.session, "after_flush")
+def _refresh_flushed_albums(session, flush_context):
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Album)}
+    refresh(session.connection(), _touched_albums(session) - deleted)
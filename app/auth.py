@@ -15,7 +15,8 @@ s = URLSafeTimedSerializer(os.getenv("SECRET_KEY", "dev_key"))
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # identity-map aware, so later lookups of this user in the request are free
+    return db.session.get(User, int(user_id))
 
 def create_user_folder(user_id):
     """Create a personal uploads folder for the user if it doesn't exist."""
@@ -0,0 +1,143 @@
+"""Edits to many files at once, for the gallery's multi-select.
+
+POST /api/bulk names a set of the owner's files and a list of operations:
+
+  {"op": "tag", "tag": "beach"}           add a tag (files that have it are skipped)
+  {"op": "untag", "tag": "beach"}         remove a tag
+  {"op": "album", "album": "Trip"}        move into an album, creating it;
+                                          "" takes the files out of their album
+  {"op": "description", "description": "..."}
+  {"op": "delete"}                        on its own only
+
+apply() runs them in order in one transaction. Each operation costs a
+statement or two for the whole set rather than a request per file: the
+tag lookups go through the (owner, name, photo) index, and the writes
+flush together. The search index, tag counts, album aggregates and page
+cache catch up in the same flush, through their after_flush hooks.
+Deleted files are removed from disk by the caller, after the commit.
+"""
+from sqlalchemy.exc import IntegrityError
+
+from .database import create_unique
+from .models import db, Album, Photo, Tag
+from .tags import MAX_TAG_LENGTH
+
+OPS = ("tag", "untag", "album", "description", "delete")
+
+
+def parse(payload: dict, max_files: int) -> tuple:
+    """(filenames, ops) from a request body; ValueError says what's wrong."""
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+    filenames = payload.get("filenames")
+    ops = payload.get("ops")
+    if not isinstance(filenames, list) or not all(isinstance(f, str) for f in filenames):
+        raise ValueError("filenames must be a list of names")
+    if not filenames:
+        raise ValueError("No files selected")
+    if len(filenames) > max_files:
+        raise ValueError(f"At most {max_files} files per request")
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("ops must be a non-empty list")
+
+    parsed = []
+    for op in ops:
+        kind = op.get("op") if isinstance(op, dict) else None
+        if kind not in OPS:
+            raise ValueError(f"Unknown operation {kind!r}")
+        if kind in ("tag", "untag"):
+            name = str(op.get("tag", "")).strip()
+            if not name:
+                raise ValueError("Empty tag")
+            if len(name) > MAX_TAG_LENGTH:
+                raise ValueError(f"Tags must be {MAX_TAG_LENGTH} characters or fewer")
+            parsed.append((kind, name))
+        elif kind == "album":
+            title = str(op.get("album", "")).strip()
+            if len(title) > 50:
+                raise ValueError("Album name must be 50 characters or fewer")
+            parsed.append((kind, title))
+        elif kind == "description":
+            parsed.append((kind, str(op.get("description", "")).strip()))
+        else:
+            parsed.append((kind, None))
+    if len(parsed) > 1 and any(kind == "delete" for kind, _ in parsed):
+        raise ValueError("delete can't be combined with other operations")
+    return list(dict.fromkeys(filenames)), parsed
+
+
+def load(owner_id: int, filenames: list) -> list:
+    """The owner's Photo rows for `filenames`; names without one are skipped."""
+    return Photo.query.filter(
+        Photo.user_id == owner_id, Photo.filename.in_(filenames)
+    ).options(
+        db.selectinload(Photo.tags),
+        db.selectinload(Photo.comments),
+        db.selectinload(Photo.jobs),
+    ).all()
+
+
+def _tagged(owner_id: int, name: str, photos: list):
+    return Tag.query.filter(
+        Tag.owner_id == owner_id,
+        Tag.name_lower == name.lower(),
+        Tag.photo_id.in_([p.id for p in photos]),
+    )
+
+
+def add_tag(owner_id: int, photos: list, name: str) -> None:
+    already = {tag.photo_id for tag in _tagged(owner_id, name, photos)}
+    # photo_id rather than photo=, so a rolled-back savepoint leaves
+    # nothing behind in Photo.tags
+    untagged = [p.id for p in photos if p.id not in already]
+    try:
+        with db.session.begin_nested():
+            db.session.add_all(Tag(photo_id=pid, owner_id=owner_id, name=name) for pid in untagged)
+    except IntegrityError:
+        # a concurrent request tagged some of them first: go one by one
+        for pid in untagged:
+            create_unique(
+                Tag(photo_id=pid, owner_id=owner_id, name=name),
+                lambda: Tag.query.filter_by(photo_id=pid, name_lower=name.lower()).first()
+            )
+
+
+def remove_tag(owner_id: int, photos: list, name: str) -> None:
+    for tag in _tagged(owner_id, name, photos):
+        db.session.delete(tag)
+
+
+def set_album(owner_id: int, photos: list, title: str) -> None:
+    album_id = None
+    if title:
+        def lookup():
+            return Album.query.filter_by(owner_id=owner_id, title=title).first()
+
+        album = lookup()
+        if not album:
+            album, _ = create_unique(Album(owner_id=owner_id, title=title), lookup)
+        album_id = album.id
+    # album_id rather than album=, which would load every photo of the
+    # old and new albums to keep Album.photos in step
+    for photo in photos:
+        photo.album_id = album_id
+
+
+def apply(owner_id: int, photos: list, ops: list) -> list:
+    """Apply parsed ops to the owner's `photos`. Caller commits. Returns
+       the photos deleted, whose files the caller removes after commit."""
+    for kind, value in ops:
+        if kind == "tag":
+            add_tag(owner_id, photos, value)
+        elif kind == "untag":
+            remove_tag(owner_id, photos, value)
+        elif kind == "album":
+            set_album(owner_id, photos, value)
+        elif kind == "description":
+            for photo in photos:
+                photo.description = value
+        elif kind == "delete":
+            for photo in photos:
+                db.session.delete(photo)
+            return photos
+    return []
@@ -0,0 +1,166 @@
+"""Rendered-page cache for the gallery, album list and album views.
+
+A cached page is keyed by the viewing user, the endpoint, its URL and
+query arguments, and that user's user.cache_version. Nothing is ever
+deleted to invalidate a page. An after_flush hook bumps cache_version for
+every user whose pages a flush could change (owners of touched photos,
+tags, albums and comments, favoriting users, both sides of a share), in
+the same transaction. The next view then simply misses, and stale
+entries age out of the LRU. login_manager loads the user row on every
+request anyway, so reading the version costs nothing.
+
+PAGE_CACHE_URL picks the store:
+  ""                   in-process LRU (per worker; the default)
+  "sqlite:///<path>"   an SQLite file shared by every worker on the host
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+from sqlalchemy import event
+
+from .models import db, User, Photo, Album, FavoriteAlbum, SharedAccess, Comment, Tag
+
+SQLITE_PREFIX = "sqlite:///"
+# the SQLite store trims itself back to max_entries every this many writes
+SQLITE_PRUNE_EVERY = 100
+
+
+class MemoryCache:
+    """Thread-safe LRU of rendered pages, local to one process."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """Rendered pages in a local SQLite file, shared between processes."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM page_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE page_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache (key, value, used_at) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self.writes += 1
+            if self.writes % SQLITE_PRUNE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM page_cache WHERE key NOT IN "
+                    "(SELECT key FROM page_cache ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+
+
+def init_app(app) -> None:
+    url = app.config["PAGE_CACHE_URL"]
+    max_entries = app.config["PAGE_CACHE_MAX_ENTRIES"]
+    if not url:
+        store = MemoryCache(max_entries)
+    elif url.startswith(SQLITE_PREFIX):
+        store = SQLiteCache(url[len(SQLITE_PREFIX):], max_entries)
+    else:
+        raise ValueError(f"Unsupported PAGE_CACHE_URL {url!r}")
+    app.extensions["page_cache"] = store
+
+
+def page_key() -> str:
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{current_user.id}:{current_user.cache_version}:{request.path}?{args}"
+
+
+def cached_page(view):
+    """Serve a view's rendered HTML from the page cache when it is current.
+
+    Only plain-string responses are stored, so redirects and errors always
+    run the view. Requests with flashed messages pending skip the cache,
+    since those messages are rendered into the page once.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config["PAGE_CACHE_ENABLED"] or session.get("_flashes"):
+            return view(*args, **kwargs)
+        store = current_app.extensions["page_cache"]
+        key = page_key()
+        page = store.get(key)
+        if page is None:
+            page = view(*args, **kwargs)
+            if isinstance(page, str):
+                store.set(key, page)
+        return page
+    return wrapper
+
+
+def _affected_users(session) -> set:
+    user_ids, comment_photo_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Photo, User)):
+            user_ids.add(obj.id if isinstance(obj, User) else obj.user_id)
+        elif isinstance(obj, (Album, Tag)):
+            user_ids.add(obj.owner_id)
+        elif isinstance(obj, FavoriteAlbum):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, SharedAccess):
+            user_ids.update((obj.owner_id, obj.shared_user_id))
+        elif isinstance(obj, Comment):
+            comment_photo_ids.add(obj.photo_id)
+    comment_photo_ids.discard(None)
+    if comment_photo_ids:
+        user_ids.update(
+            uid for (uid,) in session.connection().execute(
+                db.select(Photo.user_id).where(Photo.id.in_(comment_photo_ids))
+            )
+        )
+    user_ids.discard(None)
+    return user_ids
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_cache_versions(session, flush_context):
+    user_ids = _affected_users(session)
+    if user_ids:
+        session.connection().execute(
+            User.__table__.update()
+            .where(User.__table__.c.id.in_(user_ids))
+            .values(cache_version=User.__table__.c.cache_version + 1)
+        )
@@ -0,0 +1,207 @@
+"""Flask CLI commands (run with `flask --app run <command>`)."""
+from pathlib import Path
+
+import click
+
+
+def register_commands(app):
+    @app.cli.command("init-db")
+    def init_db():
+        """Create the schema in a new, empty database."""
+        from .database import bootstrap
+
+        if bootstrap():
+            click.echo("Created the database and stamped it at the latest migration.")
+        else:
+            click.echo("The database already has tables; run `flask --app run db upgrade` instead.")
+
+    @app.cli.command("import-json")
+    @click.option(
+        "--data-dir",
+        type=click.Path(exists=True, file_okay=False, path_type=Path),
+        default=Path(app.root_path).parent,
+        show_default=True,
+        help="Folder holding descriptions.json, albums.json, comments.json and tags.json.",
+    )
+    def import_json(data_dir):
+        """Migrate the legacy JSON metadata files into the database."""
+        from .importer import import_legacy_metadata
+
+        stats = import_legacy_metadata(data_dir)
+        click.echo(
+            "Imported {photos} files ({skipped} already present), {albums} albums, "
+            "{tags} tags, {comments} comments, {favorites} favorites.".format(**stats)
+        )
+
+    @app.cli.command("backfill-renditions")
+    @click.option("--user-id", type=int, default=None, help="Only process this user's uploads.")
+    @click.option("--force", is_flag=True, help="Rebuild renditions that already exist.")
+    def backfill_renditions(user_id, force):
+        """Build missing thumbnails and lightbox renditions for existing uploads."""
+        from .media import UPLOAD_BASE, allowed_file, generate_renditions, renditions_missing
+        from .metrics import scanned
+
+        folders = [UPLOAD_BASE / str(user_id)] if user_id else [
+            f for f in UPLOAD_BASE.iterdir() if f.is_dir() and f.name.isdigit()
+        ]
+        built = failed = 0
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            for path in sorted(scanned("backfill", list(folder.iterdir()))):
+                if not (path.is_file() and allowed_file(path.name)):
+                    continue
+                if not force and not renditions_missing(path.name):
+                    continue
+                try:
+                    generate_renditions(path)
+                    built += 1
+                except Exception as e:
+                    failed += 1
+                    click.echo(f"{path}: {e}", err=True)
+        click.echo(f"Built renditions for {built} files ({failed} failed).")
+
+    @app.cli.command("media-worker")
+    def media_worker():
+        """Process queued uploads until interrupted (MEDIA_WORKER_MODE=external)."""
+        from .jobs import MediaWorker
+
+        worker = MediaWorker(app)
+        click.echo(f"Media worker running with {worker.max_workers} processes.")
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            worker.stop()
+
+    @app.cli.command("transcode-videos")
+    @click.option("--user-id", type=int, default=None, help="Only queue this user's videos.")
+    @click.option("--force", is_flag=True, help="Rebuild streams that already exist.")
+    def transcode_videos(user_id, force):
+        """Queue streaming copies (faststart MP4, HLS) for existing videos."""
+        from . import jobs
+        from .media import VIDEO_EXTENSIONS, streams_missing
+        from .models import db, Photo
+
+        query = Photo.query.filter_by(status='ready')
+        if user_id:
+            query = query.filter_by(user_id=user_id)
+        queued = []
+        for photo in query:
+            if photo.filename.rsplit(".", 1)[-1].lower() not in VIDEO_EXTENSIONS:
+                continue
+            if force or streams_missing(Path(jobs.media_path(photo))):
+                queued.append(jobs.enqueue(photo, 'transcode'))
+        db.session.commit()
+        if app.config["MEDIA_WORKER_MODE"] == "inline":
+            failed = jobs.run_inline(queued)
+            click.echo(f"Transcoded {len(queued) - len(failed)} videos ({len(failed)} failed).")
+        else:
+            click.echo(f"Queued {len(queued)} videos for transcoding.")
+
+    @app.cli.command("reconcile-media")
+    @click.option("--user-id", type=int, default=None, help="Only reconcile this user's library.")
+    @click.option("--prune", is_flag=True,
+                  help="Delete rows (with their tags and comments) whose file has gone.")
+    def reconcile_media(user_id, prune):
+        """Sync the media manifest with files added or removed outside the app."""
+        from .manifest import reconcile_library
+        from .models import User
+
+        user_ids = [user_id] if user_id else [u.id for u in User.query.all()]
+        for uid in user_ids:
+            stats = reconcile_library(uid, prune=prune)
+            if prune:
+                missing = f"{stats['removed']} removed"
+            else:
+                missing = f"{stats['missing']} missing (kept; --prune removes them)"
+            click.echo(f"User {uid}: {stats['added']} added, {missing}, "
+                       f"{stats['updated']} updated.")
+
+    @app.cli.command("hash-media")
+    @click.option("--user-id", type=int, default=None, help="Only hash this user's uploads.")
+    def hash_media(user_id):
+        """Fill in content and perceptual hashes for files uploaded before
+        dedup and near-duplicate grouping existed."""
+        from .media import user_folder, file_sha256, image_dhash
+        from .models import db, Photo
+
+        query = Photo.query.filter(db.or_(
+            Photo.content_hash.is_(None),
+            db.and_(Photo.media_type == 'image', Photo.phash.is_(None)),
+        ))
+        if user_id:
+            query = query.filter_by(user_id=user_id)
+        seen = {
+            (uid, h) for uid, h in db.session.query(Photo.user_id, Photo.content_hash)
+            .filter(Photo.content_hash.isnot(None))
+        }
+        hashed = duplicates = failed = 0
+        for photo in query.all():
+            path = user_folder(photo.user_id) / photo.filename
+            if not path.is_file():
+                continue
+            if photo.media_type == 'image' and photo.phash is None:
+                try:
+                    photo.phash = image_dhash(path)
+                except Exception as e:
+                    failed += 1
+                    click.echo(f"{path}: {e}", err=True)
+            if photo.content_hash is not None:
+                continue
+            # HEIC uploads were converted in place, so this hashes the JPEG;
+            # a re-upload of the same HEIC still won't match, as before
+            content_hash = file_sha256(path)
+            if (photo.user_id, content_hash) in seen:
+                # an existing duplicate; left unhashed rather than deleted
+                duplicates += 1
+                continue
+            seen.add((photo.user_id, content_hash))
+            photo.content_hash = content_hash
+            hashed += 1
+        db.session.commit()
+        click.echo(f"Hashed {hashed} files; {duplicates} duplicate copies left as they are"
+                   f"{f', {failed} unreadable images' if failed else ''}.")
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index():
+        """Rebuild the full-text search index from the metadata tables."""
+        from . import search
+
+        if not search.enabled():
+            raise click.ClickException("The database has no photo_search table (SQLite with FTS5 only).")
+        click.echo(f"Indexed {search.rebuild()} files.")
+
+    @app.cli.command("rebuild-album-aggregates")
+    def rebuild_album_aggregates():
+        """Recompute every album's counts and cover thumbnails."""
+        from . import aggregates
+
+        click.echo(f"Refreshed {aggregates.rebuild()} albums.")
+
+    @app.cli.command("rebuild-tag-counts")
+    def rebuild_tag_counts():
+        """Recount every owner's tags for the tag cloud."""
+        from . import tags
+
+        click.echo(f"Counted {tags.rebuild()} distinct tags.")
+
+    @app.cli.command("purge-uploads")
+    def purge_uploads():
+        """Delete resumable uploads that were abandoned part-way through."""
+        from datetime import timedelta
+        from .resumable import purge_stale_uploads
+
+        n = purge_stale_uploads(timedelta(hours=app.config["UPLOAD_SESSION_TTL_HOURS"]))
+        click.echo(f"Purged {n} stale uploads.")
+
+    @app.cli.command("compact-db")
+    def compact_db():
+        """Checkpoint the SQLite WAL, merge the search index and VACUUM."""
+        from . import database
+
+        if not database.is_sqlite():
+            raise click.ClickException("compact-db only applies to SQLite databases.")
+        stats = database.compact()
+        busy, wal_pages, done = stats["checkpoint"]
+        click.echo(f"Checkpointed {done}/{wal_pages} WAL pages"
+                   f"{' (readers still busy)' if busy else ''}; database vacuumed.")
@@ -0,0 +1,133 @@
+"""Keeping the database safe under several gunicorn workers.
+
+SQLite allows one writer at a time. With the default rollback journal,
+readers block that writer, and a worker that finds the database locked
+fails at once. init_app() gives every connection:
+
+  journal_mode=WAL      readers and the writer no longer block each other
+  synchronous=NORMAL    commits skip the per-transaction fsync; WAL is
+                        synced at checkpoints, so bursts of small edits
+                        share one fsync and a crash can't corrupt the file
+  busy_timeout          a worker waits for the write lock instead of
+                        raising "database is locked"
+
+The WAL is the append-only journal: a commit appends its pages and
+returns, and crash recovery replays it on the next open. Checkpoints fold
+the WAL back into the main file. SQLite runs them automatically, but a
+steady stream of readers can starve them, so the media worker also runs a
+passive checkpoint every DB_CHECKPOINT_SECONDS. journal_size_limit then
+truncates the WAL file after a checkpoint. `flask --app run compact-db`
+does a full checkpoint, merges the search index's segments and VACUUMs.
+
+With SQL_QUERY_COUNT on, every response carries an X-Query-Count header
+(and a debug log line) with the number of statements its request ran, to
+catch N+1 patterns; benchmarks/query_counts.py reports the same numbers.
+
+Check-then-insert on a unique key (album titles, tags, favorites, legacy
+photo rows) can still race between workers; create_unique() turns the
+loser's IntegrityError into "use the row the other worker made".
+"""
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from .models import db
+
+
+def init_app(app) -> None:
+    with app.app_context():
+        engine = db.engine
+    if app.config["SQL_QUERY_COUNT"]:
+        count_queries(app, engine)
+    if engine.dialect.name != "sqlite":
+        return
+    busy_timeout = app.config["SQLITE_BUSY_TIMEOUT_MS"]
+    wal_limit = app.config["SQLITE_WAL_SIZE_LIMIT"]
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.execute(f"PRAGMA journal_size_limit={int(wal_limit)}")
+        cursor.close()
+
+
+def count_queries(app, engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        # the embedded media worker's queries run outside any request
+        if has_request_context():
+            g._query_count = g.get("_query_count", 0) + 1
+
+    @app.after_request
+    def _report_query_count(response):
+        count = g.get("_query_count", 0)
+        response.headers["X-Query-Count"] = str(count)
+        app.logger.debug(f"{request.method} {request.path}: {count} queries")
+        return response
+
+
+def is_sqlite() -> bool:
+    return db.engine.dialect.name == "sqlite"
+
+
+def checkpoint(mode: str = "PASSIVE") -> tuple:
+    """Copy committed WAL pages into the database file.
+
+    PASSIVE never waits on readers or writers; TRUNCATE waits (up to
+    busy_timeout) and empties the WAL. Returns SQLite's (busy, wal_pages,
+    checkpointed_pages).
+    """
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode {mode!r}")
+    with db.engine.connect() as conn:
+        return tuple(conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one())
+
+
+def compact() -> dict:
+    """Full maintenance pass: checkpoint, merge FTS segments, VACUUM."""
+    from . import search
+
+    stats = {"checkpoint": checkpoint("TRUNCATE")}
+    with db.engine.connect() as conn:
+        if search.enabled():
+            conn.exec_driver_sql("INSERT INTO photo_search(photo_search) VALUES ('optimize')")
+            conn.commit()
+        conn.exec_driver_sql("PRAGMA optimize")
+    # VACUUM can't run inside a transaction
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    stats["checkpoint_after_vacuum"] = checkpoint("TRUNCATE")
+    return stats
+
+
+def bootstrap() -> bool:
+    """Create the schema in an empty database and stamp it as migrated to
+       the latest revision. Returns False, touching nothing, if the database
+       already has tables: `flask db upgrade` brings those up to date."""
+    from flask_migrate import stamp
+
+    if db.inspect(db.engine).get_table_names():
+        return False
+    db.create_all()
+    stamp()
+    return True
+
+
+def create_unique(obj, lookup):
+    """Insert `obj` under a savepoint; if a concurrent request already
+       inserted the same unique key, return lookup()'s row instead.
+
+    Returns (row, created).
+    """
+    try:
+        with db.session.begin_nested():
+            db.session.add(obj)
+    except IntegrityError:
+        existing = lookup()
+        if existing is None:
+            raise
+        return existing, False
+    return obj, True
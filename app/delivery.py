@@ -0,0 +1,106 @@
+"""Sending media files to the browser.
+
+Every media URL sits behind login_required, so Flask can't simply hand the
+folders to the web server as static files. The view still does the
+authorization, but with MEDIA_OFFLOAD set it only emits a header and lets
+the front-end server stream the bytes:
+
+  ""                  Flask/Werkzeug streams the file itself (the default)
+  "x-accel-redirect"  nginx: X-Accel-Redirect to MEDIA_ACCEL_PREFIX + the
+                      path relative to MEDIA_ROOT, e.g. with
+                          location /_protected/ { internal; alias /srv/app/; }
+  "x-sendfile"        Apache mod_xsendfile / lighttpd: X-Sendfile with the
+                      absolute path (Flask's USE_X_SENDFILE)
+
+Either way Range requests work, so seeking a video in the lightbox fetches
+only the bytes it needs: nginx and mod_xsendfile answer them natively, and
+Werkzeug's conditional responses do when Flask streams.
+
+Caching is always private, since every response depends on the login.
+Originals are named by uuid and renditions carry media.RENDITION_VERSION
+in their URL, so both are served as immutable for MEDIA_CACHE_MAX_AGE.
+Everything else gets an ETag and must be revalidated, which turns
+unchanged pages and polls into bodiless 304s.
+"""
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+
+from flask import current_app, request, abort, send_file
+from werkzeug.security import safe_join
+
+OFFLOAD_MODES = ("", "x-accel-redirect", "x-sendfile")
+
+# HLS playlists and segments; the system tables often lack or misname these
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/mp2t", ".ts")
+
+
+def init_app(app) -> None:
+    mode = app.config["MEDIA_OFFLOAD"]
+    if mode not in OFFLOAD_MODES:
+        raise ValueError(f"MEDIA_OFFLOAD must be one of {OFFLOAD_MODES}, not {mode!r}")
+    if mode == "x-sendfile":
+        app.config["USE_X_SENDFILE"] = True
+
+
+def accel_response(path: Path, as_attachment: bool):
+    """An empty response telling nginx which internal location to serve."""
+    rel = path.resolve().relative_to(Path(current_app.config["MEDIA_ROOT"]).resolve())
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    response = current_app.response_class(mimetype=mimetype)
+    if as_attachment:
+        response.headers.set("Content-Disposition", "attachment", filename=path.name)
+    prefix = current_app.config["MEDIA_ACCEL_PREFIX"].rstrip("/")
+    response.headers["X-Accel-Redirect"] = quote(f"{prefix}/{rel.as_posix()}")
+    return response
+
+
+def private_cache(response, immutable: bool = False):
+    """Cache-Control for a logged-in user's response: browser cache only,
+       and dropped when the session cookie changes."""
+    cache = response.cache_control
+    cache.public = False
+    cache.private = True
+    if immutable:
+        cache.no_cache = False
+        cache.max_age = current_app.config["MEDIA_CACHE_MAX_AGE"]
+        cache.immutable = True
+    else:
+        cache.no_cache = True
+        cache.max_age = None
+        response.expires = None
+    response.vary.add("Cookie")
+    return response
+
+
+def revalidate(response):
+    """after_request hook: ETag pages and JSON so an unchanged response is a
+       304, and make browsers revalidate instead of guessing freshness."""
+    if (
+        request.method in ("GET", "HEAD")
+        and response.status_code == 200
+        and not response.direct_passthrough
+        and response.mimetype in ("text/html", "application/json")
+        and "ETag" not in response.headers
+    ):
+        response.add_etag()
+        private_cache(response)
+        response.make_conditional(request)
+    return response
+
+
+def send_media(directory, filename: str, as_attachment: bool = False, immutable: bool = False):
+    """Send directory/filename, honouring Range, conditional GET and
+       MEDIA_OFFLOAD; 404 if it isn't a file inside directory."""
+    joined = safe_join(str(directory), filename)
+    if joined is None or not Path(joined).is_file():
+        abort(404)
+    path = Path(joined)
+    if current_app.config["MEDIA_OFFLOAD"] == "x-accel-redirect":
+        # nginx adds its own ETag/Last-Modified and keeps our Cache-Control
+        return private_cache(accel_response(path, as_attachment), immutable)
+    # conditional=True is what makes Werkzeug answer Range/If-Range with 206
+    # and If-None-Match/If-Modified-Since with 304
+    response = send_file(path, as_attachment=as_attachment, conditional=True)
+    return private_cache(response, immutable)
@@ -0,0 +1,60 @@
+"""The feed: the viewer's library and every gallery shared with them,
+newest first, as one stream.
+
+Each owner's photos are already sorted by (upload_time, id) in the
+ix_photo_user_upload index, so a page is a k-way merge rather than a sort
+of everyone's library. For a page of n items after the cursor, each owner
+contributes at most its n + 1 newest keys, read as a range scan of that
+owner's slice of the index; the slices go to the database as one
+UNION ALL, and heapq.merge interleaves them lazily, stopping once it has
+n + 1. Only those keys' photos are loaded. Since photo ids are unique
+across owners, (upload_time, id) is a total order and the same keyset
+cursor as a single gallery works across the merge.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from .models import db, Photo
+
+# owners per UNION ALL; SQLite allows at most 500 terms in a compound select
+OWNERS_PER_QUERY = 200
+
+
+def feed_owner_ids(user, grants: dict) -> list:
+    """The viewer followed by the owners of every gallery shared with them."""
+    return [user.id, *(oid for oid in grants if oid != user.id)]
+
+
+def _owner_slices(owner_ids: list, after, per_owner: int) -> dict:
+    """{owner_id: [(upload_time, id), ...]}: each owner's newest `per_owner`
+       keys older than the `after` key, newest first."""
+    slices = defaultdict(list)
+    for start in range(0, len(owner_ids), OWNERS_PER_QUERY):
+        selects = []
+        for owner_id in owner_ids[start:start + OWNERS_PER_QUERY]:
+            query = db.select(Photo.user_id, Photo.upload_time, Photo.id).where(
+                Photo.user_id == owner_id
+            )
+            if after:
+                ts, photo_id = after
+                query = query.where(db.or_(
+                    Photo.upload_time < ts,
+                    db.and_(Photo.upload_time == ts, Photo.id < photo_id)
+                ))
+            query = query.order_by(Photo.upload_time.desc(), Photo.id.desc()).limit(per_owner)
+            # wrapped, since SQLite won't take ORDER BY/LIMIT on a compound term
+            selects.append(db.select(query.subquery()))
+        for owner_id, upload_time, photo_id in db.session.execute(db.union_all(*selects)):
+            slices[owner_id].append((upload_time, photo_id))
+    for keys in slices.values():
+        # a compound select doesn't promise to keep each term's order
+        keys.sort(reverse=True)
+    return slices
+
+
+def merged_keys(owner_ids: list, after, limit: int) -> list:
+    """The first `limit` (upload_time, id) keys after `after` across all
+       the owners' libraries, newest first."""
+    slices = _owner_slices(owner_ids, after, limit)
+    return list(islice(heapq.merge(*slices.values(), reverse=True), limit))
@@ -0,0 +1,140 @@
+"""One-shot import of the legacy JSON sidecar files into the metadata tables.
+
+Before v4.5 all metadata lived in four global JSON files keyed by filename:
+descriptions.json, albums.json (which also held per-user favorites and
+placeholder entries for empty albums), comments.json and tags.json.
+"""
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from flask import current_app
+
+from .models import db, User, Photo, Album, FavoriteAlbum, Comment, Tag
+from .media import UPLOAD_BASE, allowed_file, media_type_for
+from . import metrics
+
+COMMENT_SEPARATOR = " — "
+UPLOADED_BY_PREFIX = "Uploaded by "
+
+
+def load_json(path: Path) -> dict:
+    if path.exists():
+        started = time.perf_counter()
+        data = path.read_bytes()
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            current_app.logger.error(f"Invalid JSON in {path}")
+        finally:
+            metrics.record_json("load", len(data), time.perf_counter() - started)
+    return {}
+
+
+def _user_folders(upload_base: Path) -> dict:
+    """Map user id -> upload folder for every uploads/<user_id>/ directory."""
+    if not upload_base.exists():
+        return {}
+    return {
+        int(folder.name): folder for folder in metrics.scanned("import", list(upload_base.iterdir()))
+        if folder.is_dir() and folder.name.isdigit()
+    }
+
+
+def import_legacy_metadata(data_dir: Path, upload_base: Path = UPLOAD_BASE) -> dict:
+    """Create Photo/Album/Tag/Comment/FavoriteAlbum rows from the JSON files.
+
+    Files that already have a Photo row are left untouched, so running the
+    import twice does not duplicate comments or tags. Empty-album
+    placeholders (entries whose title no file uses) are created for every
+    user that has an upload folder, since the JSON does not record who
+    made them. Returns counts of what was imported.
+    """
+    descs    = load_json(data_dir / "descriptions.json")
+    albums   = load_json(data_dir / "albums.json")
+    comments = load_json(data_dir / "comments.json")
+    tags     = load_json(data_dir / "tags.json")
+    favorites = albums.pop("favorites", {})
+
+    users = {u.id: u for u in User.query.all()}
+    folders = {uid: f for uid, f in _user_folders(upload_base).items() if uid in users}
+    owners = {
+        f.name: (uid, f)
+        for uid, folder in folders.items()
+        for f in metrics.scanned("import", list(folder.iterdir()))
+        if f.is_file() and allowed_file(f.name)
+    }
+    existing = {fn for (fn,) in db.session.query(Photo.filename)}
+    album_cache = {}
+    stats = {"photos": 0, "albums": 0, "tags": 0, "comments": 0, "favorites": 0, "skipped": 0}
+
+    def album_for(owner_id, title):
+        key = (owner_id, title)
+        if key not in album_cache:
+            album = Album.query.filter_by(owner_id=owner_id, title=title).first()
+            if not album:
+                album = Album(owner_id=owner_id, title=title)
+                db.session.add(album)
+                stats["albums"] += 1
+            album_cache[key] = album
+        return album_cache[key]
+
+    for fn, (owner_id, path) in owners.items():
+        if fn in existing:
+            stats["skipped"] += 1
+            continue
+
+        uploader_alias = users[owner_id].username
+        file_comments = []
+        for line in comments.get(fn, []):
+            if line.startswith(UPLOADED_BY_PREFIX):
+                uploader_alias = line[len(UPLOADED_BY_PREFIX):].strip() or uploader_alias
+            elif COMMENT_SEPARATOR in line:
+                alias, text = line.split(COMMENT_SEPARATOR, 1)
+                file_comments.append(Comment(commenter_alias=alias.strip(), text=text))
+            else:
+                file_comments.append(Comment(commenter_alias="Unknown", text=line))
+
+        title = albums.get(fn)
+        st = path.stat()
+        photo = Photo(
+            filename=fn,
+            user_id=owner_id,
+            uploader_alias=uploader_alias,
+            media_type=media_type_for(fn),
+            description=descs.get(fn, ""),
+            upload_time=datetime.utcfromtimestamp(st.st_mtime),
+            file_size=st.st_size,
+            file_mtime=st.st_mtime,
+            album=album_for(owner_id, title) if title else None,
+            comments=file_comments,
+        )
+        seen = set()
+        for name in tags.get(fn, []):
+            if name.lower() not in seen:
+                seen.add(name.lower())
+                photo.tags.append(Tag(name=name, owner_id=owner_id))
+        db.session.add(photo)
+        stats["photos"] += 1
+        stats["tags"] += len(photo.tags)
+        stats["comments"] += len(file_comments)
+
+    titles_with_files = {albums[fn] for fn in owners if fn in albums}
+    for key, title in albums.items():
+        if key == title and key not in owners and title not in titles_with_files:
+            for owner_id in folders:
+                album_for(owner_id, title)
+
+    for uid, titles in favorites.items():
+        if not uid.isdigit() or int(uid) not in users:
+            continue
+        for title in titles:
+            album = album_for(int(uid), title)
+            db.session.flush()
+            if not db.session.get(FavoriteAlbum, (int(uid), album.id)):
+                db.session.add(FavoriteAlbum(user_id=int(uid), album_id=album.id))
+                stats["favorites"] += 1
+
+    db.session.commit()
+    return stats
@@ -0,0 +1,289 @@
+"""Out-of-band media processing backed by the media_job table.
+
+upload() only saves the original and enqueues a job; a worker claims
+pending jobs and runs media.process_upload in a process pool, so HEIC
+decoding and video frame extraction never tie up a web worker. The queue
+lives in the app's own database, so no broker is needed.
+
+MEDIA_WORKER_MODE picks who drains the queue:
+  embedded - a background thread in each web process (the default)
+  external - a separate `flask --app run media-worker` process
+  inline   - the upload request itself, synchronously (handy for debugging)
+
+Jobs come in two kinds. 'process' makes the thumbnails and flips the photo
+to ready. Once a video's is done, a 'transcode' job builds its streaming
+copies (media.transcode_video); the photo stays ready throughout, playing
+the original until the stream exists. Process jobs are always claimed
+first, and when there is more than one pool slot, one is kept free of
+transcodes, so a long encode never holds back new uploads' thumbnails.
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flask import current_app
+
+from .models import db, Photo, MediaJob
+
+from .media import (
+    user_folder, media_type_for, process_upload, transcode_video,
+    remove_renditions, remove_streams
+)
+from . import database, metrics
+
+# one embedded worker per process; keyed by pid so forked web workers start their own
+_embedded_workers = {}
+_embedded_lock = threading.Lock()
+
+
+def enqueue(photo: Photo, kind: str = 'process') -> MediaJob:
+    """Queue work for a photo, marking it pending unless it's only a
+       transcode. Caller commits."""
+    if kind == 'process':
+        photo.status = 'pending'
+    job = MediaJob(photo=photo, kind=kind)
+    db.session.add(job)
+    return job
+
+
+def media_path(photo: Photo) -> str:
+    return str(user_folder(photo.user_id) / photo.filename)
+
+
+def job_task(job: MediaJob) -> tuple:
+    """The picklable (function, args) a worker process runs for a job."""
+    path = media_path(job.photo)
+    if job.kind == 'transcode':
+        return transcode_video, (path, tuple(current_app.config["VIDEO_HLS_HEIGHTS"]))
+    return process_upload, (path,)
+
+
+def transcode_slots(max_workers: int) -> int:
+    return max(1, max_workers - 1)
+
+
+def claim_jobs(limit: int, kind: str = 'process') -> list:
+    """Atomically move up to `limit` pending jobs of one kind to running.
+
+    The conditional UPDATE means two workers racing for the same row can't
+    both win it, whichever database backs the queue.
+    """
+    ids = [
+        job_id for (job_id,) in db.session.query(MediaJob.id)
+        .filter_by(kind=kind, status='pending').order_by(MediaJob.id).limit(limit)
+    ]
+    claimed = []
+    for job_id in ids:
+        won = MediaJob.query.filter_by(id=job_id, status='pending').update({
+            "status": 'running',
+            "started_at": datetime.utcnow(),
+            "attempts": MediaJob.attempts + 1,
+        }, synchronize_session=False)
+        if won:
+            claimed.append(job_id)
+    db.session.commit()
+    if not claimed:
+        return []
+    return MediaJob.query.filter(MediaJob.id.in_(claimed)).order_by(MediaJob.id).all()
+
+
+def requeue_stale_jobs(timeout_seconds: int) -> int:
+    """Put jobs whose worker died mid-run back in the queue."""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    n = MediaJob.query.filter(
+        MediaJob.status == 'running',
+        MediaJob.started_at < cutoff
+    ).update({"status": 'pending'}, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def finish_job(job_id: int, result: dict = None, error: Exception = None):
+    """Record a job's outcome on the job and its photo. Returns the
+       follow-up transcode job it queued, if any."""
+    job = db.session.get(MediaJob, job_id)
+    if job is None:
+        # the photo was deleted while it was being processed
+        if result and "path" in result:
+            remove_streams(Path(result["path"]))
+        elif result:
+            remove_renditions(result["filename"])
+        return None
+    if job.kind == 'transcode':
+        return finish_transcode(job, result, error)
+
+    photo = job.photo
+    job.finished_at = datetime.utcnow()
+    timings = dict(job.timings or {})
+    if job.started_at and job.created_at:
+        timings["queued"] = round((job.started_at - job.created_at).total_seconds(), 3)
+    follow_up = None
+    if error is None:
+        for field in ("filename", "width", "height", "phash", "file_size", "file_mtime"):
+            setattr(photo, field, result[field])
+        timings.update(result["timings"])
+        photo.status = 'ready'
+        job.status = 'done'
+        if current_app.config["VIDEO_TRANSCODE"] and media_type_for(photo.filename) == "video":
+            follow_up = enqueue(photo, 'transcode')
+    else:
+        photo.status = 'failed'
+        job.status = 'failed'
+        job.error = str(error)
+        current_app.logger.error(f"Media job {job_id} for {photo.filename} failed: {error}")
+    job.timings = timings
+    db.session.commit()
+    metrics.record_job(job.kind, job.status, timings)
+    return follow_up
+
+
+def finish_transcode(job: MediaJob, result: dict = None, error: Exception = None) -> None:
+    """A failed transcode leaves the photo ready; the original still plays."""
+    job.finished_at = datetime.utcnow()
+    timings = dict(job.timings or {})
+    if job.started_at and job.created_at:
+        timings["queued"] = round((job.started_at - job.created_at).total_seconds(), 3)
+    if error is None:
+        timings.update(result["timings"])
+        job.status = 'done'
+    else:
+        job.status = 'failed'
+        job.error = str(error)
+        current_app.logger.error(f"Transcode job {job.id} for {job.photo.filename} failed: {error}")
+    job.timings = timings
+    db.session.commit()
+    metrics.record_job(job.kind, job.status, timings)
+
+
+def run_inline(jobs: list) -> list:
+    """Process jobs during the current request, then any transcodes they
+       queue. Returns the jobs that failed.
+
+    A batch is spread over up to MEDIA_WORKERS processes; a single file is
+    done in-process, where starting a pool would cost more than it saves.
+    """
+    failed = []
+    while jobs:
+        for job in jobs:
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            job.attempts += 1
+        tasks = {job.id: job_task(job) for job in jobs}
+        db.session.commit()
+
+        workers = min(len(jobs), current_app.config["MEDIA_WORKERS"])
+        failed_ids, follow_ups = set(), []
+
+        def finish(job_id, **outcome):
+            follow_up = finish_job(job_id, **outcome)
+            if follow_up is not None:
+                follow_ups.append(follow_up)
+            if "error" in outcome:
+                failed_ids.add(job_id)
+
+        if workers <= 1:
+            for job_id, (fn, args) in tasks.items():
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    finish(job_id, error=e)
+                else:
+                    finish(job_id, result=result)
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = {pool.submit(fn, *args): job_id for job_id, (fn, args) in tasks.items()}
+                for fut in as_completed(futures):
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        finish(futures[fut], error=e)
+                    else:
+                        finish(futures[fut], result=result)
+        failed += [job for job in jobs if job.id in failed_ids]
+        jobs = follow_ups
+    return failed
+
+
+class MediaWorker:
+    """Claims jobs from the queue and runs them in a process pool."""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_workers = app.config["MEDIA_WORKERS"]
+        self.poll_interval = app.config["MEDIA_JOB_POLL_SECONDS"]
+        self.job_timeout = app.config["MEDIA_JOB_TIMEOUT_SECONDS"]
+        self.checkpoint_interval = app.config["DB_CHECKPOINT_SECONDS"]
+        self.last_checkpoint = time.monotonic()
+        self.stop_event = threading.Event()
+
+    def maybe_checkpoint(self) -> None:
+        """Passive WAL checkpoint every checkpoint_interval (SQLite only)."""
+        if time.monotonic() - self.last_checkpoint < self.checkpoint_interval:
+            return
+        self.last_checkpoint = time.monotonic()
+        if database.is_sqlite():
+            database.checkpoint("PASSIVE")
+
+    def run_forever(self) -> None:
+        # spawn, not fork: the embedded worker lives in a threaded web process
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx) as pool:
+            inflight = {}  # future -> (job id, kind)
+            with self.app.app_context():
+                requeue_stale_jobs(self.job_timeout)
+            while not self.stop_event.is_set():
+                with self.app.app_context():
+                    try:
+                        free = self.max_workers - len(inflight)
+                        claimed = claim_jobs(free) if free else []
+                        transcoding = sum(kind == 'transcode' for _, kind in inflight.values())
+                        free = min(free - len(claimed), transcode_slots(self.max_workers) - transcoding)
+                        if free > 0:
+                            claimed += claim_jobs(free, kind='transcode')
+                        for job in claimed:
+                            fn, args = job_task(job)
+                            inflight[pool.submit(fn, *args)] = (job.id, job.kind)
+                        for fut in [f for f in inflight if f.done()]:
+                            job_id, _ = inflight.pop(fut)
+                            try:
+                                finish_job(job_id, result=fut.result())
+                            except Exception as e:
+                                finish_job(job_id, error=e)
+                        self.maybe_checkpoint()
+                    except Exception as e:
+                        db.session.rollback()
+                        current_app.logger.error(f"Media worker loop error: {e}")
+                    finally:
+                        db.session.remove()
+
+                if inflight:
+                    wait(list(inflight), timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self.stop_event.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+
+def start_embedded_worker(app) -> None:
+    pid = os.getpid()
+    with _embedded_lock:
+        if pid in _embedded_workers:
+            return
+        worker = MediaWorker(app)
+        thread = threading.Thread(target=worker.run_forever, name="media-worker", daemon=True)
+        _embedded_workers[pid] = worker
+        thread.start()
+
+
+def init_app(app) -> None:
+    @app.before_request
+    def _ensure_media_worker():
+        # started lazily so CLI commands and pre-fork imports don't spawn pools
+        if current_app.config["MEDIA_WORKER_MODE"] == "embedded":
+            start_embedded_worker(current_app._get_current_object())
@@ -0,0 +1,81 @@
+"""Keeps the photo table's file manifest in step with uploads/<user_id>/.
+
+upload(), the media worker and delete_image() maintain the manifest
+(size, mtime, dimensions) as they go, so listing pages read it straight
+from the database. reconcile_library() is the slow path for changes made
+behind the app's back: files copied in or removed by hand, or a restore
+from backup. Run it with `flask --app run reconcile-media`; rows whose
+file has gone are only reported unless --prune is given, since deleting
+them takes their tags and comments too, and an unmounted folder looks
+just like an emptied one.
+"""
+from pathlib import Path
+from datetime import datetime
+
+from .models import db, User, Photo
+from .media import allowed_file, media_type_for, user_folder, probe_dimensions
+from . import jobs, metrics
+
+
+def reconcile_library(owner_id: int, prune: bool = False) -> dict:
+    """Bring one owner's manifest in line with their upload folder.
+
+    New files get a Photo row and a processing job (which builds their
+    renditions and fills in dimensions); size/mtime are refreshed for
+    files that changed on disk; rows whose file has gone are counted as
+    missing, and removed only with `prune`. Files still being processed
+    are left alone: the worker may already have renamed a HEIC original
+    to its JPEG without having updated the row yet. Returns counts of
+    what changed.
+    """
+    stats = {"added": 0, "removed": 0, "missing": 0, "updated": 0}
+    owner = db.session.get(User, owner_id)
+    if owner is None:
+        return stats
+
+    on_disk = {
+        f.name: f for f in metrics.scanned("reconcile", list(user_folder(owner_id).iterdir()))
+        if f.is_file() and allowed_file(f.name)
+    }
+    tracked = {p.filename: p for p in Photo.query.filter_by(user_id=owner_id)}
+    # stems of files mid-processing, whose name on disk may be about to change
+    busy = {Path(fn).stem for fn, p in tracked.items() if p.status != 'ready'}
+
+    for fn, photo in tracked.items():
+        if photo.status != 'ready':
+            continue
+        path = on_disk.get(fn)
+        if path is None:
+            stats["missing"] += 1
+            if prune:
+                db.session.delete(photo)
+                stats["removed"] += 1
+            continue
+        st = path.stat()
+        if photo.file_size != st.st_size or photo.file_mtime != st.st_mtime:
+            photo.file_size = st.st_size
+            photo.file_mtime = st.st_mtime
+            photo.width, photo.height = probe_dimensions(path)
+            stats["updated"] += 1
+        elif photo.width is None:
+            photo.width, photo.height = probe_dimensions(path)
+
+    for fn, path in on_disk.items():
+        if fn in tracked or Path(fn).stem in busy:
+            continue
+        st = path.stat()
+        photo = Photo(
+            filename=fn,
+            user_id=owner_id,
+            uploader_alias=owner.username,
+            media_type=media_type_for(fn),
+            upload_time=datetime.utcfromtimestamp(st.st_mtime),
+            file_size=st.st_size,
+            file_mtime=st.st_mtime,
+        )
+        db.session.add(photo)
+        jobs.enqueue(photo)
+        stats["added"] += 1
+
+    db.session.commit()
+    return stats
@@ -0,0 +1,554 @@
+"""Derived media: grid thumbnails, lightbox renditions, video frames and
+video streams.
+
+Originals in uploads/<user_id>/ are never modified, apart from HEIC
+uploads which are converted to JPEG once; everything else is written to
+renditions/ and keyed by the original's filename stem, which is a uuid4
+hex and therefore never reused. renditions/ sits outside app/static/ so
+the files are only served through the routes that check who may see them.
+
+Videos also get a streaming copy in uploads/<user_id>/streams/: a
+faststart H.264/AAC MP4 (moov atom up front, so playback starts before the
+download finishes) and, if asked for, an HLS ladder in streams/<stem>/.
+That runs as its own, later job (see jobs.py) because it can take minutes.
+
+Nothing in here touches the database or the Flask app, so these functions
+can run in the media worker's child processes (see jobs.py).
+"""
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import av
+import imageio_ffmpeg
+from PIL import Image, ImageOps
+import pillow_heif
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+BASE_DIR             = Path(__file__).parent.parent
+UPLOAD_BASE          = BASE_DIR / "uploads"
+RENDITION_BASE       = BASE_DIR / "renditions"
+THUMB_FOLDER         = RENDITION_BASE / "thumbnails"
+LIGHTBOX_FOLDER      = RENDITION_BASE / "lightbox"
+PREVIEW_FOLDER       = RENDITION_BASE / "previews"
+THUMB_SIZE_WIDTH     = 320
+LIGHTBOX_SIZE_WIDTH  = 1600
+THUMB_QUALITY        = 80
+LIGHTBOX_QUALITY     = 82
+HEIC_JPEG_QUALITY    = 90
+VIDEO_PREVIEW_FRAMES = 8     # keyframes in a video's hover preview; 0 turns previews off
+VIDEO_PREVIEW_MS     = 400   # how long each preview frame is shown
+PREVIEW_QUALITY      = 70
+EXIF_ORIENTATION     = 0x0112
+STREAM_FOLDER        = "streams"  # per-user subfolder for transcoded videos
+STREAM_MAX_HEIGHT    = 1080       # shorter side of the faststart MP4
+STREAM_CRF           = 23
+STREAM_AUDIO_BITRATE = "128k"
+HLS_SEGMENT_SECONDS  = 6
+# peak video bitrate per HLS rendition height; others get height * 4 kbit/s
+HLS_MAXRATE_KBPS     = {2160: 16000, 1440: 9000, 1080: 5000, 720: 2800, 480: 1400, 360: 800, 240: 400}
+# part of every rendition URL; bump it when rendition settings change so
+# browsers holding the old files (cached as immutable) fetch the new ones
+RENDITION_VERSION    = 1
+HASH_BLOCK           = 1024 * 1024
+
+IMAGE_EXTENSIONS  = {"png", "jpg", "jpeg", "gif", "bmp", "webp", "heic"}
+VIDEO_EXTENSIONS  = {"mp4", "mov", "avi", "mkv"}
+ALLOWED_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# lets Image.open() read HEIC files during backfills
+pillow_heif.register_heif_opener()
+
+UPLOAD_BASE.mkdir(parents=True, exist_ok=True)
+THUMB_FOLDER.mkdir(parents=True, exist_ok=True)
+LIGHTBOX_FOLDER.mkdir(parents=True, exist_ok=True)
+PREVIEW_FOLDER.mkdir(parents=True, exist_ok=True)
+
+
+def allowed_file(filename: str) -> bool:
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def media_type_for(filename: str) -> str:
+    ext = filename.rsplit(".", 1)[-1].lower()
+    return "video" if ext in VIDEO_EXTENSIONS else "image"
+
+
+def user_folder(user_id: int) -> Path:
+    """Get or create the upload folder for a given user."""
+    path = UPLOAD_BASE / str(user_id)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def thumb_name(filename: str) -> str:
+    return f"{Path(filename).stem}.jpg"
+
+
+def lightbox_name(filename: str) -> str:
+    return f"{Path(filename).stem}.webp"
+
+
+def preview_name(filename: str) -> str:
+    """Animated WebP preview of a video (lightbox_name is for images only)."""
+    return f"{Path(filename).stem}.webp"
+
+
+def stream_name(filename: str) -> str:
+    return f"{Path(filename).stem}.mp4"
+
+
+def hls_master_name(filename: str) -> str:
+    return f"{Path(filename).stem}/master.m3u8"
+
+
+@contextmanager
+def atomic_output(dest: Path):
+    """Yield a temp path next to `dest`, then fsync it and rename it over
+       `dest`, so a concurrent reader sees the old file or the new one,
+       never a half-written one. The temp file is removed on failure."""
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield tmp
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def save_stream(stream, dest: Path) -> str:
+    """Copy an upload stream to `dest`, hashing it on the way, so dedup
+       doesn't need a second read of the file. Returns the SHA-256 hex."""
+    digest = hashlib.sha256()
+    with open(dest, "wb") as f:
+        for block in iter(lambda: stream.read(HASH_BLOCK), b""):
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _resize_to_width(img: Image.Image, width: int) -> Image.Image:
+    """Scale down to at most `width` pixels wide, keeping the aspect ratio."""
+    w, h = img.size
+    if w <= width:
+        return img
+    return img.resize((width, max(1, round(h * width / w))), Image.Resampling.LANCZOS)
+
+
+def image_dimensions(src: Image.Image) -> tuple:
+    """Displayed (width, height) of an opened image, honouring EXIF rotation."""
+    width, height = src.size
+    if src.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: each bit says whether a pixel of a 9x8
+       grayscale copy is darker than its right-hand neighbour. Resizing,
+       recompression and small exposure changes flip few bits, so near
+       duplicates have a small Hamming distance (see similar.py)."""
+    px = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (px[row * 9 + col] < px[row * 9 + col + 1])
+    return bits
+
+
+def image_dhash(image_path: Path) -> int:
+    """dhash() of an image file, decoded at reduced size where the format allows."""
+    with Image.open(image_path) as src:
+        src.draft("RGB", (THUMB_SIZE_WIDTH, THUMB_SIZE_WIDTH))
+        return dhash(ImageOps.exif_transpose(src))
+
+
+def generate_image_renditions(image_path: Path) -> tuple:
+    """Write the grid thumbnail (JPEG) and lightbox rendition (WebP) for an
+       image; returns the original's (width, height) and the thumbnail's
+       dhash()."""
+    try:
+        with Image.open(image_path) as src:
+            dimensions = image_dimensions(src)
+            # JPEG can decode straight to a reduced size, which is far cheaper
+            # than decoding a 12MP original and scaling it down afterwards
+            src.draft("RGB", (LIGHTBOX_SIZE_WIDTH, LIGHTBOX_SIZE_WIDTH))
+            img = ImageOps.exif_transpose(src)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+
+            lightbox = _resize_to_width(img, LIGHTBOX_SIZE_WIDTH)
+            with atomic_output(LIGHTBOX_FOLDER / lightbox_name(image_path.name)) as tmp:
+                lightbox.save(tmp, format="WEBP", quality=LIGHTBOX_QUALITY, method=4)
+
+            thumb = _resize_to_width(lightbox, THUMB_SIZE_WIDTH)
+            with atomic_output(THUMB_FOLDER / thumb_name(image_path.name)) as tmp:
+                thumb.save(tmp, format="JPEG", quality=THUMB_QUALITY,
+                           optimize=True, progressive=True)
+        return dimensions, dhash(thumb)
+    except Exception as e:
+        logger.error(f"Error generating renditions for {image_path}: {e}")
+        raise
+
+
+def _keyframe_near(container, stream, seconds: float):
+    """Decode the keyframe at or just before `seconds`, or None.
+
+    Seeking lands on a keyframe and skip_frame keeps the decoder from
+    reconstructing anything in between, so this costs one frame's decode
+    whatever the resolution or position.
+    """
+    if seconds > 0:
+        container.seek(int(seconds / stream.time_base), stream=stream, backward=True)
+    for frame in container.decode(stream):
+        return frame
+    return None
+
+
+def _frame_to_image(frame, width: int) -> Image.Image:
+    """Scale a decoded frame to `width` (display orientation) in swscale,
+       rather than converting the full-size frame and resizing in PIL."""
+    rotation = getattr(frame, "rotation", 0) or 0
+    sideways = abs(rotation) % 180 == 90
+    src_w, src_h = (frame.height, frame.width) if sideways else (frame.width, frame.height)
+    scale = min(1.0, width / src_w)
+    out_w, out_h = max(2, round(src_w * scale)), max(2, round(src_h * scale))
+    if sideways:
+        out_w, out_h = out_h, out_w
+    img = frame.reformat(width=out_w, height=out_h, format="rgb24").to_image()
+    return img.rotate(rotation, expand=True) if rotation else img
+
+
+def video_keyframe_renditions(video_path: Path, thumb_path: Path,
+                              preview_path: Path = None,
+                              preview_frames: int = VIDEO_PREVIEW_FRAMES) -> tuple:
+    """Thumbnail from the keyframe nearest a video's midpoint, plus an
+       optional animated preview of keyframes spread across it; returns the
+       video's displayed (width, height)."""
+    with av.open(str(video_path)) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+        stream.thread_type = "AUTO"
+        if stream.duration is not None:
+            duration = float(stream.duration * stream.time_base)
+        else:
+            duration = (container.duration or 0) / av.time_base
+
+        frame = _keyframe_near(container, stream, duration / 2 if duration > 1 else 0)
+        if frame is None:
+            raise ValueError(f"No decodable video frames in {video_path.name}")
+        rotation = getattr(frame, "rotation", 0) or 0
+        dimensions = (frame.height, frame.width) if abs(rotation) % 180 == 90 \
+            else (frame.width, frame.height)
+
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_output(thumb_path) as tmp:
+            _frame_to_image(frame, THUMB_SIZE_WIDTH).save(tmp, format="JPEG", quality=THUMB_QUALITY)
+
+        if preview_path is not None and preview_frames > 1 and duration > 1:
+            frames = []
+            for i in range(preview_frames):
+                frame = _keyframe_near(container, stream, duration * (i + 0.5) / preview_frames)
+                if frame is not None:
+                    frames.append(_frame_to_image(frame, THUMB_SIZE_WIDTH))
+            if len(frames) > 1:
+                with atomic_output(preview_path) as tmp:
+                    frames[0].save(tmp, format="WEBP", save_all=True, append_images=frames[1:],
+                                   duration=VIDEO_PREVIEW_MS, loop=0, quality=PREVIEW_QUALITY)
+    return dimensions
+
+
+def moviepy_video_thumbnail(video_path: Path, thumb_path: Path) -> tuple:
+    """The original MoviePy path, kept as a fallback for files PyAV can't
+       seek; returns the video's (width, height)."""
+    with VideoFileClip(str(video_path)) as clip:
+        t = clip.duration / 2 if clip.duration > 1 else 0.1
+        frame = clip.get_frame(t)
+        dimensions = tuple(clip.size)
+    img = Image.fromarray(frame)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    w, h = img.size
+    new_h = int(h * (THUMB_SIZE_WIDTH / w))
+    img = img.resize((THUMB_SIZE_WIDTH, new_h), Image.Resampling.LANCZOS)
+    thumb_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_output(thumb_path) as tmp:
+        img.save(tmp, format="JPEG")
+    return dimensions
+
+
+def generate_video_thumbnail(video_path: Path, thumb_path: Path) -> tuple:
+    """Write a thumbnail (and hover preview) for a video; returns its (width, height)."""
+    try:
+        return video_keyframe_renditions(
+            video_path, thumb_path, PREVIEW_FOLDER / preview_name(video_path.name)
+        )
+    except Exception as e:
+        logger.warning(f"Keyframe extraction failed for {video_path}, using MoviePy: {e}")
+    try:
+        return moviepy_video_thumbnail(video_path, thumb_path)
+    except Exception as e:
+        logger.error(f"Error generating thumbnail for {video_path}: {e}")
+        raise
+
+
+def generate_renditions(media_path: Path) -> tuple:
+    """Create whatever derived files the gallery needs for one original.
+
+    Returns the original's (width, height), or (None, None) if unknown,
+    and its perceptual hash (images only, else None).
+    """
+    ext = media_path.suffix.lstrip(".").lower()
+    if ext in VIDEO_EXTENSIONS:
+        return generate_video_thumbnail(media_path, THUMB_FOLDER / thumb_name(media_path.name)), None
+    if ext in IMAGE_EXTENSIONS:
+        return generate_image_renditions(media_path)
+    return (None, None), None
+
+
+def probe_dimensions(media_path: Path) -> tuple:
+    """(width, height) of an image from its header alone, without decoding."""
+    if media_path.suffix.lstrip(".").lower() not in IMAGE_EXTENSIONS:
+        return None, None
+    try:
+        with Image.open(media_path) as src:
+            return image_dimensions(src)
+    except Exception:
+        return None, None
+
+
+def convert_heic(heic_path: Path) -> Path:
+    """Replace a HEIC original with a JPEG of the same stem and return its path."""
+    hf = pillow_heif.read_heif(str(heic_path))
+    img = Image.frombytes(hf.mode, hf.size, hf.data, 'raw')
+    jpeg_path = heic_path.with_suffix(".jpg")
+    with atomic_output(jpeg_path) as tmp:
+        img.save(tmp, format='JPEG', quality=HEIC_JPEG_QUALITY)
+    heic_path.unlink()
+    return jpeg_path
+
+
+def process_upload(media_path: str) -> dict:
+    """All post-upload work for one original: HEIC conversion, then renditions.
+
+    Runs in a worker process, so it takes and returns plain values. The
+    returned filename differs from the input when a HEIC was converted;
+    `timings` holds seconds spent per stage.
+    """
+    started = time.perf_counter()
+    timings = {}
+    path = Path(media_path)
+    if path.suffix.lower() == ".heic":
+        path = convert_heic(path)
+        timings["convert"] = time.perf_counter() - started
+    stage = time.perf_counter()
+    (width, height), phash = generate_renditions(path)
+    timings["renditions"] = time.perf_counter() - stage
+    timings["total"] = time.perf_counter() - started
+    st = path.stat()
+    return {
+        "filename": path.name,
+        "width": width,
+        "height": height,
+        "phash": phash,
+        "file_size": st.st_size,
+        "file_mtime": st.st_mtime,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+
+
+def _probe_streams(video_path: Path) -> dict:
+    with av.open(str(video_path)) as container:
+        video = container.streams.video[0]
+        audio = container.streams.audio[0] if container.streams.audio else None
+        rotation = 0
+        for frame in container.decode(video):
+            rotation = getattr(frame, "rotation", 0) or 0
+            break
+        return {
+            "format": container.format.name,
+            "video_codec": video.codec_context.name,
+            "pix_fmt": video.codec_context.pix_fmt,
+            "width": video.codec_context.width,
+            "height": video.codec_context.height,
+            "fps": float(video.average_rate or 30),
+            "rotation": rotation,
+            "audio_codec": audio.codec_context.name if audio else None,
+        }
+
+
+def _needs_reencode(info: dict) -> bool:
+    """Whether a video must be re-encoded, rather than just remuxed with
+       its moov atom moved to the front, to play in every browser."""
+    return not (
+        info["video_codec"] == "h264"
+        and info["pix_fmt"] in ("yuv420p", "yuvj420p")
+        and min(info["width"], info["height"]) <= STREAM_MAX_HEIGHT
+        and info["audio_codec"] in (None, "aac", "mp3")
+        # MP4/MOV; copying H.264 out of AVI or MKV can mangle timestamps
+        and "mp4" in info["format"].split(",")
+    )
+
+
+def _run_ffmpeg(args: list) -> None:
+    cmd = [imageio_ffmpeg.get_ffmpeg_exe(), "-nostdin", "-hide_banner", "-loglevel", "error", "-y", *args]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.strip()[-500:]}")
+
+
+def _scale_filter(short_side: int) -> str:
+    """Scale so the shorter side is at most `short_side`, never upscaling.
+       ffmpeg applies rotation metadata before filters, so iw/ih are the
+       displayed dimensions."""
+    return (f"scale='if(gt(iw,ih),-2,min({short_side},iw))'"
+            f":'if(gt(iw,ih),min({short_side},ih),-2)'")
+
+
+def _x264_args(fps: float) -> list:
+    gop = max(1, round(fps * HLS_SEGMENT_SECONDS))
+    return ["-c:v", "libx264", "-preset", "veryfast", "-profile:v", "high",
+            "-pix_fmt", "yuv420p", "-g", str(gop), "-sc_threshold", "0"]
+
+
+def _audio_args() -> list:
+    return ["-c:a", "aac", "-b:a", STREAM_AUDIO_BITRATE, "-ac", "2"]
+
+
+def transcode_faststart(video_path: Path, out_path: Path, info: dict) -> str:
+    """Write the streaming MP4. Returns "remux" when the original's streams
+       could be copied as-is, "transcode" when they were re-encoded."""
+    mode = "transcode" if _needs_reencode(info) else "remux"
+    if mode == "remux":
+        codec_args = ["-c", "copy"]
+    else:
+        codec_args = [*_x264_args(info["fps"]), "-crf", str(STREAM_CRF),
+                      "-vf", _scale_filter(STREAM_MAX_HEIGHT), *_audio_args()]
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_output(out_path) as tmp:
+        _run_ffmpeg(["-i", str(video_path), "-map", "0:v:0", "-map", "0:a:0?", *codec_args,
+                     "-map_metadata", "-1", "-movflags", "+faststart", "-f", "mp4", str(tmp)])
+    return mode
+
+
+def _variant_bandwidth(playlist: Path) -> int:
+    """Peak bits per second over a variant's segments, for the master playlist."""
+    peak, duration = 0, None
+    for line in playlist.read_text().splitlines():
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration:
+            peak = max(peak, (playlist.parent / line).stat().st_size * 8 / duration)
+            duration = None
+    return int(peak) or 1
+
+
+def transcode_hls(video_path: Path, out_dir: Path, info: dict, heights) -> list:
+    """Write an HLS rendition per height (none taller than the source) and a
+       master playlist into out_dir, replacing it whole. Returns the heights."""
+    displayed = (info["height"], info["width"]) if abs(info["rotation"]) % 180 == 90 \
+        else (info["width"], info["height"])
+    short_side = min(displayed)
+    ladder = sorted({h for h in heights if h <= short_side} or {min(short_side, min(heights))},
+                    reverse=True)
+
+    work = out_dir.with_name(f".{out_dir.name}.{uuid.uuid4().hex}.tmp")
+    work.mkdir(parents=True)
+    try:
+        variants = []
+        for height in ladder:
+            maxrate = HLS_MAXRATE_KBPS.get(height, height * 4)
+            _run_ffmpeg([
+                "-i", str(video_path), "-map", "0:v:0", "-map", "0:a:0?",
+                *_x264_args(info["fps"]), "-crf", str(STREAM_CRF),
+                "-maxrate", f"{maxrate}k", "-bufsize", f"{maxrate * 2}k",
+                "-vf", _scale_filter(height), *_audio_args(),
+                "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+                "-hls_segment_filename", str(work / f"{height}p_%05d.ts"),
+                str(work / f"{height}p.m3u8"),
+            ])
+            with av.open(str(work / f"{height}p_00000.ts")) as segment:
+                stream = segment.streams.video[0].codec_context
+                resolution = f"{stream.width}x{stream.height}"
+            variants.append((height, resolution, _variant_bandwidth(work / f"{height}p.m3u8")))
+
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        for height, resolution, bandwidth in variants:
+            lines += [f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={resolution}",
+                      f"{height}p.m3u8"]
+        (work / "master.m3u8").write_text("\n".join(lines) + "\n")
+
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        os.replace(work, out_dir)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return ladder
+
+
+def transcode_video(media_path: str, hls_heights=()) -> dict:
+    """Build a video's streaming copies; the transcode job's counterpart to
+       process_upload, with the same plain-values-in, plain-values-out shape.
+       An empty hls_heights skips HLS."""
+    started = time.perf_counter()
+    path = Path(media_path)
+    out_dir = path.parent / STREAM_FOLDER
+    info = _probe_streams(path)
+    mode = transcode_faststart(path, out_dir / stream_name(path.name), info)
+    timings = {"faststart": time.perf_counter() - started}
+    ladder = []
+    if hls_heights:
+        stage = time.perf_counter()
+        ladder = transcode_hls(path, out_dir / path.stem, info, hls_heights)
+        timings["hls"] = time.perf_counter() - stage
+    timings["total"] = time.perf_counter() - started
+    return {
+        "filename": path.name,
+        "path": str(path),
+        "mode": mode,
+        "hls": ladder,
+        "timings": {k: round(v, 3) for k, v in timings.items()},
+    }
+
+
+def remove_streams(video_path: Path) -> None:
+    """Delete the streaming copies made by transcode_video, if any."""
+    out_dir = video_path.parent / STREAM_FOLDER
+    (out_dir / stream_name(video_path.name)).unlink(missing_ok=True)
+    shutil.rmtree(out_dir / video_path.stem, ignore_errors=True)
+
+
+def streams_missing(video_path: Path) -> bool:
+    return not (video_path.parent / STREAM_FOLDER / stream_name(video_path.name)).exists()
+
+
+def remove_renditions(filename: str) -> None:
+    for path in (THUMB_FOLDER / thumb_name(filename),
+                 LIGHTBOX_FOLDER / lightbox_name(filename),
+                 PREVIEW_FOLDER / preview_name(filename)):
+        if path.exists():
+            path.unlink()
+
+
+def renditions_missing(filename: str) -> bool:
+    if not (THUMB_FOLDER / thumb_name(filename)).exists():
+        return True
+    ext = filename.rsplit(".", 1)[-1].lower()
+    return ext in IMAGE_EXTENSIONS and not (LIGHTBOX_FOLDER / lightbox_name(filename)).exists()
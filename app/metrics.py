@@ -0,0 +1,287 @@
+"""Request, SQL and media-job metrics, served at /metrics in the
+Prometheus text format, plus an opt-in sampling profiler.
+
+init_app() records, per endpoint:
+
+  photoshare_request_seconds        latency histogram (by method and status)
+  photoshare_request_sql_queries    statements per request (histogram)
+  photoshare_sql_seconds_total      time spent in those statements
+  photoshare_template_seconds       Jinja render time, by template
+
+and elsewhere in the app: legacy JSON reads (importer.load_json), upload
+folder scans (reconcile, import, backfill), and media job outcomes and
+per-stage durations (jobs.finish_job). The registry lives in the process
+that does the work, so under gunicorn each worker serves its own numbers,
+and with MEDIA_WORKER_MODE=external the job metrics stay in the worker.
+Statements run outside a request (the embedded media worker) count under
+the endpoint "-". /metrics answers only requests bearing METRICS_TOKEN;
+while the token is unset it is a 404, though the numbers are still kept.
+
+With PROFILER_ENABLED on, adding ?_profile=1 to any URL replaces the
+response with a sampled profile of that request: a thread reads the
+handling thread's stack every PROFILER_INTERVAL_MS and the result is
+printed in the collapsed-stack format that flamegraph.pl and speedscope
+read. It is meant for development; leave it off in production.
+"""
+import hmac
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from pathlib import Path
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+JOB_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+BYTES_BUCKETS = (1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 256 * 1024 ** 2)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.label_names, labels)} {value:g}"
+
+
+class Histogram:
+    """Cumulative buckets, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels) -> None:
+        with self.lock:
+            entry = self.values.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted((k, (list(c), s, n)) for k, (c, s, n) in self.values.items())
+        for labels, (counts, total, n) in items:
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{bound:g}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}"
+            inf = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, inf)} {n}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {n}"
+
+
+REQUEST_SECONDS = Histogram(
+    "photoshare_request_seconds", "Time to handle a request.",
+    ("endpoint", "method", "status"))
+REQUEST_QUERIES = Histogram(
+    "photoshare_request_sql_queries", "SQL statements run per request.",
+    ("endpoint",), QUERY_BUCKETS)
+SQL_SECONDS = Counter(
+    "photoshare_sql_seconds_total", "Time spent executing SQL statements.", ("endpoint",))
+SQL_QUERIES = Counter(
+    "photoshare_sql_queries_total", "SQL statements executed.", ("endpoint",))
+TEMPLATE_SECONDS = Histogram(
+    "photoshare_template_seconds", "Time to render a Jinja template.", ("template",))
+JSON_SECONDS = Histogram(
+    "photoshare_json_seconds", "Time to read a legacy JSON metadata file.", ("op",))
+JSON_BYTES = Histogram(
+    "photoshare_json_bytes", "Size of legacy JSON metadata files read.", ("op",),
+    BYTES_BUCKETS)
+FS_SCANS = Counter(
+    "photoshare_fs_scans_total", "Directory listings of upload folders.", ("kind",))
+FS_SCAN_ENTRIES = Counter(
+    "photoshare_fs_scan_entries_total", "Entries read by upload folder listings.", ("kind",))
+JOBS = Counter(
+    "photoshare_media_jobs_total", "Media jobs finished.", ("kind", "status"))
+JOB_STAGE_SECONDS = Histogram(
+    "photoshare_media_job_stage_seconds", "Time a media job spent in each stage.",
+    ("kind", "stage"), JOB_BUCKETS)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def record_json(op: str, nbytes: int, seconds: float) -> None:
+    JSON_SECONDS.observe(seconds, op)
+    JSON_BYTES.observe(nbytes, op)
+
+
+def scanned(kind: str, entries: list) -> list:
+    """Count a directory listing; returns `entries` so call sites can wrap
+       the listing in place."""
+    FS_SCANS.inc(kind)
+    FS_SCAN_ENTRIES.inc(kind, amount=len(entries))
+    return entries
+
+
+def record_job(kind: str, status: str, timings: dict) -> None:
+    JOBS.inc(kind, status)
+    for stage, seconds in timings.items():
+        JOB_STAGE_SECONDS.observe(seconds, kind, stage)
+
+
+def _endpoint() -> str:
+    if not has_request_context():
+        return "-"
+    return request.endpoint or "unmatched"
+
+
+class Sampler(threading.Thread):
+    """Samples another thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = StackCounter()
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self.done.set()
+        self.join()
+
+    def report(self, elapsed: float) -> str:
+        header = (f"# {sum(self.stacks.values())} samples at {self.interval * 1000:g} ms "
+                  f"over {elapsed:.3f} s; collapsed stacks, busiest first\n")
+        return header + "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def init_app(app) -> None:
+    if not app.config["METRICS_ENABLED"]:
+        return
+    with app.app_context():
+        from .models import db
+        engine = db.engine
+
+    # the start time rides on the statement's execution context, which
+    # both the success and the error event are handed
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def _record_query(context):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        del context._metrics_started
+        endpoint = _endpoint()
+        SQL_QUERIES.inc(endpoint)
+        SQL_SECONDS.inc(endpoint, amount=time.perf_counter() - started)
+        if has_request_context():
+            g._metrics_queries = g.get("_metrics_queries", 0) + 1
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        _record_query(context)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(exception_context):
+        # e.g. the IntegrityError create_unique() expects when it loses a race
+        _record_query(exception_context.execution_context)
+
+    @before_render_template.connect_via(app)
+    def _start_render(sender, template, context, **extra):
+        g.setdefault("_metrics_renders", []).append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def _end_render(sender, template, context, **extra):
+        started = g.get("_metrics_renders")
+        if started:
+            TEMPLATE_SECONDS.observe(time.perf_counter() - started.pop(), template.name or "-")
+
+    @app.before_request
+    def _start_request():
+        g._metrics_started = time.perf_counter()
+        if app.config["PROFILER_ENABLED"] and request.args.get("_profile"):
+            g._profiler = Sampler(threading.get_ident(), app.config["PROFILER_INTERVAL_MS"] / 1000)
+            g._profiler.start()
+
+    @app.after_request
+    def _end_request(response):
+        started = g.get("_metrics_started")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint()
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method, response.status_code)
+        REQUEST_QUERIES.observe(g.get("_metrics_queries", 0), endpoint)
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.stop()
+            return Response(profiler.report(elapsed), mimetype="text/plain")
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exc):
+        # after_request doesn't run if the response itself failed
+        profiler = g.pop("_profiler", None)
+        if profiler is not None:
+            profiler.stop()
+
+    def metrics_view():
+        token = current_app.config["METRICS_TOKEN"]
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            abort(401)
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
@@ -24,6 +24,12 @@ class SharedAccess(db.Model):
         back_populates='granted_access'
     )
 
+    __table_args__ = (
+        db.Index('ix_shared_access_owner_user', 'owner_id', 'shared_user_id'),
+        # grants_for() looks up everything shared with one user
+        db.Index('ix_shared_access_user_owner', 'shared_user_id', 'owner_id'),
+    )
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -31,8 +37,11 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(128), nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # bumped whenever anything on this user's pages changes (see cache.py)
+    cache_version = db.Column(db.Integer, nullable=False, default=0)
 
     photos = db.relationship('Photo', backref='owner', lazy=True)
+    albums = db.relationship('Album', backref='owner', lazy=True)
     shared_users = db.relationship(
         'SharedAccess',
         foreign_keys='SharedAccess.owner_id',
@@ -46,17 +55,169 @@ class User(db.Model, UserMixin):
         cascade='all, delete-orphan'
     )
 
+class Album(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    title = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # what the albums page shows, kept up to date on every flush that
+    # changes the album's photos (see aggregates.py)
+    photo_count = db.Column(db.Integer, nullable=False, default=0)
+    video_count = db.Column(db.Integer, nullable=False, default=0)
+    cover_filenames = db.Column(db.JSON)  # newest first
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    photos = db.relationship('Photo', backref='album', lazy=True)
+    favorites = db.relationship('FavoriteAlbum', backref='album', lazy=True,
+                                cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.UniqueConstraint('owner_id', 'title', name='uq_album_owner_title'),
+    )
+
+class FavoriteAlbum(db.Model):
+    __tablename__ = 'favorite_album'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    album_id = db.Column(db.Integer, db.ForeignKey('album.id'), primary_key=True, index=True)
+
 class Photo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(120), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(120), nullable=False, unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    album_id = db.Column(db.Integer, db.ForeignKey('album.id'), nullable=True, index=True)
     uploader_alias = db.Column(db.String(80), nullable=False)
+    media_type = db.Column(db.String(10), nullable=False, default='image')  # 'image' or 'video'
+    description = db.Column(db.Text, nullable=False, default='')
+    status = db.Column(db.String(10), nullable=False, default='ready')  # 'pending', 'ready' or 'failed'
+    # manifest of the file on disk, so listings never need to stat uploads/
+    file_size = db.Column(db.BigInteger)
+    file_mtime = db.Column(db.Float)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # SHA-256 of the file as uploaded; one copy of any content per owner
+    content_hash = db.Column(db.String(64))
+    # 64-bit dHash (stored signed), and its four 16-bit bands for the
+    # near-duplicate index (see similar.py)
+    phash = db.Column(db.BigInteger)
+    phash_b0 = db.Column(db.Integer)
+    phash_b1 = db.Column(db.Integer)
+    phash_b2 = db.Column(db.Integer)
+    phash_b3 = db.Column(db.Integer)
     upload_time = db.Column(db.DateTime, default=datetime.utcnow)
-    comments = db.relationship('Comment', backref='photo', lazy=True)
+    comments = db.relationship('Comment', backref='photo', lazy=True,
+                               order_by='Comment.id', cascade='all, delete-orphan')
+    tags = db.relationship('Tag', backref='photo', lazy=True,
+                           order_by='Tag.id', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        # keyset pagination of a gallery: newest first within one owner
+        db.Index('ix_photo_user_upload', 'user_id', 'upload_time', 'id'),
+        # an album's newest photos: its cover, and the album view
+        db.Index('ix_photo_album_upload', 'album_id', 'upload_time', 'id'),
+        db.UniqueConstraint('user_id', 'content_hash', name='uq_photo_owner_hash'),
+        db.Index('ix_photo_phash_b0', 'user_id', 'phash_b0'),
+        db.Index('ix_photo_phash_b1', 'user_id', 'phash_b1'),
+        db.Index('ix_photo_phash_b2', 'user_id', 'phash_b2'),
+        db.Index('ix_photo_phash_b3', 'user_id', 'phash_b3'),
+    )
+
+    @db.validates('phash')
+    def _set_phash_bands(self, key, value):
+        """Takes the unsigned hash; fills the band columns and returns it
+           as a signed 64-bit integer, which is what SQLite can store."""
+        if value is None:
+            self.phash_b0 = self.phash_b1 = self.phash_b2 = self.phash_b3 = None
+            return None
+        value &= 0xFFFFFFFFFFFFFFFF
+        self.phash_b0, self.phash_b1, self.phash_b2, self.phash_b3 = (
+            (value >> shift) & 0xFFFF for shift in (48, 32, 16, 0)
+        )
+        return value - (1 << 64) if value >= 1 << 63 else value
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    photo_id = db.Column(db.Integer, db.ForeignKey('photo.id'), nullable=False)
+    photo_id = db.Column(db.Integer, db.ForeignKey('photo.id'), nullable=False, index=True)
     commenter_alias = db.Column(db.String(80), nullable=False)
     text = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+# counted from the photo_id index (rowid included), so a gallery page shows
+# comment counts without loading the comments; undefer() it where needed
+Photo.comment_count = db.column_property(
+    db.select(db.func.count(Comment.id))
+    .where(Comment.photo_id == Photo.id)
+    .correlate_except(Comment)
+    .scalar_subquery(),
+    deferred=True,
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    photo_id = db.Column(db.Integer, db.ForeignKey('photo.id'), nullable=False, index=True)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    name_lower = db.Column(db.String(64), nullable=False)  # case-folded lookup key
+
+    __table_args__ = (
+        db.UniqueConstraint('photo_id', 'name_lower', name='uq_tag_photo_name'),
+        # tag -> photos; covering, so a tag filter never reads the tag rows
+        db.Index('ix_tag_owner_name_photo', 'owner_id', 'name_lower', 'photo_id'),
+    )
+
+    @db.validates('name')
+    def _set_name_lower(self, key, value):
+        self.name_lower = value.lower()
+        return value
+
+class TagCount(db.Model):
+    """How many of an owner's files carry each tag, for the tag cloud;
+       maintained on every flush that changes tags (see tags.py)."""
+    __tablename__ = 'tag_count'
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    name_lower = db.Column(db.String(64), primary_key=True)
+    name = db.Column(db.String(64), nullable=False)  # the most recently used spelling
+    count = db.Column(db.Integer, nullable=False)
+
+class MediaJob(db.Model):
+    """Post-upload processing for one photo: HEIC conversion and thumbnails
+       ('process'), or a video's streaming copies ('transcode')."""
+    __tablename__ = 'media_job'
+    id = db.Column(db.Integer, primary_key=True)
+    photo_id = db.Column(db.Integer, db.ForeignKey('photo.id'), nullable=False, index=True)
+    kind = db.Column(db.String(10), nullable=False, default='process', server_default='process')
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # seconds per stage: save, queued, convert, renditions, total (process)
+    # or queued, faststart, hls, total (transcode)
+    timings = db.Column(db.JSON)
+
+    photo = db.relationship(
+        'Photo',
+        backref=db.backref('jobs', lazy=True, cascade='all, delete-orphan')
+    )
+
+    __table_args__ = (
+        db.Index('ix_media_job_status', 'status', 'id'),
+        db.Index('ix_media_job_kind_status', 'kind', 'status', 'id'),
+    )
+
+
+class UploadSession(db.Model):
+    """A resumable upload in progress; its bytes so far live in
+       uploads/<owner_id>/<id>.part until it is completed."""
+    __tablename__ = 'upload_session'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    uploader_alias = db.Column(db.String(80), nullable=False)
+    original_name = db.Column(db.String(255), nullable=False)
+    album_title = db.Column(db.String(120))
+    length = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    checksum = db.Column(db.String(64))  # expected sha256 hex of the whole file, if given
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
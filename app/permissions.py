@@ -0,0 +1,82 @@
+"""Who may upload to or comment in whose gallery.
+
+Every gallery page lists the galleries shared with the viewer (for the
+owner pickers in the upload and comment forms), and every shared upload
+or comment checks the viewer's grant. grants_for() answers both from a
+single query that joins in the owners' usernames, and caches the result
+as plain Grant tuples:
+
+  per request   in flask.g, so a page and its template share one lookup
+  per process   keyed by the viewer's user.cache_version, so no request
+                sees a stale grant: cache.py bumps the version on both
+                sides whenever a shared_access row changes. Entries also
+                expire after PERMISSION_CACHE_SECONDS, which bounds memory
+                and covers edits made outside the ORM.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, g
+
+from .models import db, User, SharedAccess
+
+Grant = namedtuple("Grant", "owner_id owner_name alias can_upload can_comment")
+
+# viewers whose grants are kept per process; the least recently used go first
+MAX_CACHED_VIEWERS = 1024
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _load_grants(user_id: int) -> dict:
+    rows = db.session.query(
+        SharedAccess.owner_id, User.username, SharedAccess.alias,
+        SharedAccess.can_upload, SharedAccess.can_comment,
+    ).join(User, User.id == SharedAccess.owner_id).filter(
+        SharedAccess.shared_user_id == user_id
+    ).order_by(User.username)
+    return {
+        owner_id: Grant(owner_id, name, alias, bool(can_upload), bool(can_comment))
+        for owner_id, name, alias, can_upload, can_comment in rows
+    }
+
+
+def grants_for(user) -> dict:
+    """{owner_id: Grant} for the galleries shared with `user`, ordered by
+       owner name."""
+    per_request = g.setdefault("_grants", {})
+    if user.id in per_request:
+        return per_request[user.id]
+
+    ttl = current_app.config["PERMISSION_CACHE_SECONDS"]
+    key = (user.id, user.cache_version)
+    now = time.monotonic()
+    grants = None
+    if ttl > 0:
+        with _cache_lock:
+            entry = _cache.get(user.id)
+            if entry and entry[0] == key and entry[1] > now:
+                _cache.move_to_end(user.id)
+                grants = entry[2]
+    if grants is None:
+        grants = _load_grants(user.id)
+        if ttl > 0:
+            with _cache_lock:
+                _cache[user.id] = (key, now + ttl, grants)
+                _cache.move_to_end(user.id)
+                while len(_cache) > MAX_CACHED_VIEWERS:
+                    _cache.popitem(last=False)
+    per_request[user.id] = grants
+    return grants
+
+
+def shared_galleries(user) -> list:
+    """The Grants for `user`, for the owner pickers in templates."""
+    return list(grants_for(user).values())
+
+
+def grant_for(user, owner_id: int):
+    """The user's Grant on owner_id's gallery, or None."""
+    return grants_for(user).get(owner_id)
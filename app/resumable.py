@@ -0,0 +1,226 @@
+"""Resumable chunked uploads for large media (a small subset of tus).
+
+    POST   /api/uploads              start: JSON {filename, size, owner_id,
+                                     album, sha256}; returns the upload's URL
+    HEAD   /api/uploads/<id>         how many bytes the server has (Upload-Offset)
+    PATCH  /api/uploads/<id>         append the request body at Upload-Offset
+    POST   /api/uploads/<id>/complete  verify, move into place and enqueue
+    DELETE /api/uploads/<id>         abandon
+
+Chunks are streamed from the request straight into
+uploads/<owner_id>/<id>.part, so nothing is spooled in memory or a temp
+file, and a dropped connection keeps whatever part of the chunk arrived
+(unless the chunk was checksummed and so can't be trusted). A PATCH may
+carry `Upload-Checksum: sha256 <base64>` for its chunk; the whole file can
+be checked against the sha256 given at creation. Completed uploads go
+through the same add_media()/job queue path as form uploads, dedup
+included: a file the owner already has is dropped, and /complete answers
+200 with the existing photo and "duplicate": true instead of 201.
+"""
+import base64
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, jsonify, url_for, current_app, abort
+from flask_login import login_required, current_user
+from werkzeug.exceptions import ClientDisconnected
+
+from .models import db, UploadSession
+from .media import allowed_file, user_folder, file_sha256
+from .routes import uploader_alias_for, media_filename, add_media, get_or_create_album
+from . import jobs
+
+resumable = Blueprint("resumable", __name__, url_prefix="/api/uploads")
+
+READ_BLOCK = 1024 * 1024
+CHECKSUM_MISMATCH = 460  # tus's status for a chunk whose Upload-Checksum is wrong
+
+
+def part_path(upload: UploadSession):
+    return user_folder(upload.owner_id) / f"{upload.id}.part"
+
+
+def get_upload(upload_id: str) -> UploadSession:
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.uploader_id != current_user.id:
+        abort(404)
+    return upload
+
+
+def offset_headers(upload: UploadSession) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Cache-Control": "no-store",
+    }
+
+
+def purge_stale_uploads(max_age: timedelta) -> int:
+    """Drop uploads nobody has touched for `max_age`, with their partial files."""
+    cutoff = datetime.utcnow() - max_age
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in stale:
+        part_path(upload).unlink(missing_ok=True)
+        db.session.delete(upload)
+    db.session.commit()
+    return len(stale)
+
+
+@resumable.route("", methods=["POST"])
+@login_required
+def create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename", "")).strip()
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed."}), 400
+    try:
+        length = int(data.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Missing file size."}), 400
+    if length <= 0 or length > current_app.config["MAX_CONTENT_LENGTH"]:
+        return jsonify({"error": "File is empty or too large."}), 413
+
+    try:
+        owner_id = int(data.get("owner_id") or current_user.id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid gallery."}), 400
+    album_title = str(data.get("album") or "").strip()
+    checksum = str(data.get("sha256") or "").strip().lower() or None
+    if checksum and len(checksum) != 64:
+        return jsonify({"error": "sha256 must be a hex digest."}), 400
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        owner_id=owner_id,
+        uploader_id=current_user.id,
+        uploader_alias=uploader_alias_for(owner_id),
+        original_name=filename[:255],
+        album_title=album_title[:120] or None,
+        length=length,
+        offset=0,
+        checksum=checksum,
+    )
+    part_path(upload).touch()
+    db.session.add(upload)
+    db.session.commit()
+
+    location = url_for("resumable.upload_status", upload_id=upload.id)
+    return jsonify({
+        "id": upload.id,
+        "url": location,
+        "offset": 0,
+        "chunk_size": current_app.config["UPLOAD_CHUNK_SIZE"],
+    }), 201, {"Location": location, **offset_headers(upload)}
+
+
+@resumable.route("/<upload_id>", methods=["HEAD"])
+@login_required
+def upload_status(upload_id):
+    upload = get_upload(upload_id)
+    return "", 200, offset_headers(upload)
+
+
+@resumable.route("/<upload_id>", methods=["PATCH"])
+@login_required
+def append_chunk(upload_id):
+    upload = get_upload(upload_id)
+    start = request.headers.get("Upload-Offset", type=int)
+    if start is None or start != upload.offset:
+        # the client's view is stale (e.g. a retried chunk already landed)
+        return jsonify({"error": "Offset mismatch."}), 409, offset_headers(upload)
+
+    expected = None
+    algorithm, _, value = request.headers.get("Upload-Checksum", "").partition(" ")
+    if algorithm:
+        if algorithm.lower() != "sha256":
+            return jsonify({"error": "Only sha256 chunk checksums are supported."}), 400
+        try:
+            expected = base64.b64decode(value, validate=True)
+        except ValueError:
+            return jsonify({"error": "Malformed Upload-Checksum."}), 400
+
+    remaining = upload.length - start
+    digest = hashlib.sha256()
+    written = 0
+    path = part_path(upload)
+    with open(path, "r+b") as f:
+        f.seek(start)
+        while True:
+            try:
+                block = request.stream.read(READ_BLOCK)
+            except ClientDisconnected:
+                # keep what arrived, unless it can't be verified
+                if expected is not None:
+                    f.truncate(start)
+                    return "", 400
+                break
+            if not block:
+                break
+            if written + len(block) > remaining:
+                f.truncate(start)
+                return jsonify({"error": "Chunk runs past the declared size."}), 413
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+        if expected is not None and digest.digest() != expected:
+            f.truncate(start)
+            return jsonify({"error": "Chunk checksum mismatch."}), CHECKSUM_MISMATCH, offset_headers(upload)
+        f.flush()
+        os.fsync(f.fileno())
+
+    # conditional so two racing PATCHes for the same offset can't both advance it
+    won = UploadSession.query.filter_by(id=upload.id, offset=start).update({
+        "offset": start + written,
+        "updated_at": datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(upload)
+    if not won:
+        return jsonify({"error": "Offset mismatch."}), 409, offset_headers(upload)
+    return "", 204, offset_headers(upload)
+
+
+@resumable.route("/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    upload = get_upload(upload_id)
+    if upload.offset != upload.length:
+        return jsonify({"error": "Upload is incomplete."}), 409, offset_headers(upload)
+
+    path = part_path(upload)
+    # chunks arrive in separate requests, so the whole-file hash (for the
+    # declared checksum and for dedup) is taken once, here
+    content_hash = file_sha256(path)
+    if upload.checksum and content_hash != upload.checksum:
+        path.unlink(missing_ok=True)
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({"error": "File checksum mismatch; upload discarded."}), CHECKSUM_MISMATCH
+
+    final = path.with_name(media_filename(upload.original_name))
+    os.replace(path, final)
+    album = get_or_create_album(upload.owner_id, upload.album_title) if upload.album_title else None
+    photo, job = add_media(final, upload.owner_id, album, upload.uploader_alias, content_hash)
+    db.session.delete(upload)
+    db.session.commit()
+
+    if job and current_app.config["MEDIA_WORKER_MODE"] == "inline":
+        jobs.run_inline([job])
+    return jsonify({
+        "id": photo.id,
+        "filename": photo.filename,
+        "status": photo.status,
+        "duplicate": job is None,
+    }), 201 if job else 200
+
+
+@resumable.route("/<upload_id>", methods=["DELETE"])
+@login_required
+def abandon_upload(upload_id):
+    upload = get_upload(upload_id)
+    part_path(upload).unlink(missing_ok=True)
+    db.session.delete(upload)
+    db.session.commit()
+    return "", 204
@@ -1,89 +1,373 @@
 import os
-import json
+import time
 import uuid
+import base64
+from datetime import datetime
 from pathlib import Path
 from urllib.parse import quote, unquote  # added to handle encoding/decoding of album titles
 from flask import (
     Blueprint, render_template, request, redirect,
-    url_for, flash, current_app, send_from_directory,
+    url_for, flash, current_app,
     abort, jsonify
 )
 from werkzeug.utils import secure_filename
-from PIL import Image
-import pillow_heif
-from moviepy.video.io.VideoFileClip import VideoFileClip
 from flask_login import login_required, current_user, logout_user
-from .models import db, User, SharedAccess
+from .models import db, User, SharedAccess, Photo, Album, FavoriteAlbum, Comment, Tag
+from .media import (
+    THUMB_FOLDER, LIGHTBOX_FOLDER, PREVIEW_FOLDER, STREAM_FOLDER,
+    allowed_file, media_type_for, user_folder, save_stream, thumb_name, lightbox_name,
+    preview_name, stream_name, hls_master_name, remove_renditions, remove_streams,
+    RENDITION_VERSION
+)
+from .delivery import send_media, revalidate
+from .cache import cached_page
+from .database import create_unique
+from . import bulk, jobs, search, similar, tags
+from .feed import feed_owner_ids, merged_keys
+from .permissions import grants_for, shared_galleries, grant_for
 
 main = Blueprint("main", __name__)
+main.after_request(revalidate)
 
-# —— Configuration Constants —— #
-BASE_DIR          = Path(__file__).parent.parent
-UPLOAD_BASE       = BASE_DIR / 'uploads'
-DATA_DIR          = BASE_DIR
-DESCRIPTION_PATH  = DATA_DIR / "descriptions.json"
-ALBUM_PATH        = DATA_DIR / "albums.json"
-COMMENTS_PATH     = DATA_DIR / "comments.json"
-TAGS_PATH         = DATA_DIR / "tags.json"
-THUMB_FOLDER      = BASE_DIR / "app" / "static" / "thumbnails"
-THUMB_SIZE_WIDTH  = 320
 
-IMAGE_EXTENSIONS  = {"png", "jpg", "jpeg", "gif", "bmp", "webp", "heic"}
-VIDEO_EXTENSIONS  = {"mp4", "mov", "avi", "mkv"}
-ALLOWED_EXTENSIONS = IMAGE_EXTENSIONS | VIDEO_EXTENSIONS
+@main.context_processor
+def tag_limits():
+    return {"max_tag_length": tags.MAX_TAG_LENGTH}
 
-# ensure directories exist
-UPLOAD_BASE.mkdir(parents=True, exist_ok=True)
-THUMB_FOLDER.mkdir(parents=True, exist_ok=True)
 
+def sanitize_filename(filename: str) -> str:
+    clean = secure_filename(filename)
+    if clean != filename:
+        abort(400, "Invalid filename.")
+    return filename
 
-def allowed_file(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def encode_cursor(sort_key: str, photo_id: int) -> str:
+    raw = f"{sort_key}|{photo_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-def load_json(path: Path) -> dict:
-    if path.exists():
-        try:
-            return json.loads(path.read_text())
-        except json.JSONDecodeError:
-            current_app.logger.error(f"Invalid JSON in {path}")
-    return {}
 
+def decode_cursor(cursor: str, parse_key=datetime.fromisoformat):
+    """Inverse of encode_cursor; a malformed cursor is a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        sort_key, photo_id = raw.split("|")
+        return parse_key(sort_key), int(photo_id)
+    except (ValueError, UnicodeDecodeError):
+        abort(400, "Invalid cursor.")
+
+
+def gallery_query(owner_id: int, tag_filter: str = "", search_query: str = ""):
+    """Photos in an owner's gallery, optionally narrowed by tag.
+
+    Search text is only applied here when the full-text index is missing;
+    otherwise gallery_page_for() ranks through it instead.
+    """
+    query = Photo.query.filter(Photo.user_id == owner_id)
+    if tag_filter:
+        # from the tag's matches to their photos, so O(matches) however
+        # large the gallery (see tags.py)
+        query = query.join(Tag, db.and_(
+            Tag.photo_id == Photo.id,
+            Tag.owner_id == owner_id,
+            Tag.name_lower == tag_filter,
+        ))
+    if search_query and not search.enabled():
+        pattern = "%{}%".format(
+            search_query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        query = query.outerjoin(Album, Photo.album_id == Album.id).filter(db.or_(
+            Photo.filename.ilike(pattern, escape="\\"),
+            Photo.description.ilike(pattern, escape="\\"),
+            Album.title.ilike(pattern, escape="\\"),
+            Photo.tags.any(Tag.name_lower.like(pattern, escape="\\")),
+        ))
+    return query
+
+
+def with_card_relations(query):
+    """Eager-load what serialize_photo() reads, so a page is two queries.
+       Comments themselves are fetched per card, when it's opened."""
+    return query.options(
+        db.selectinload(Photo.tags),
+        db.joinedload(Photo.album),
+        db.undefer(Photo.comment_count),
+    )
 
-def save_json(path: Path, data: dict) -> None:
-    path.write_text(json.dumps(data, indent=2))
 
+def paginate_gallery(query, cursor, limit: int):
+    """Keyset pagination, newest first, by (upload_time, id).
+
+    Each page is an index range scan from the cursor, so page N costs the
+    same as page 1 however large the library. Returns (photos, next_cursor).
+    """
+    if cursor:
+        ts, photo_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Photo.upload_time < ts,
+            db.and_(Photo.upload_time == ts, Photo.id < photo_id)
+        ))
+    photos = with_card_relations(query).order_by(
+        Photo.upload_time.desc(), Photo.id.desc()
+    ).limit(limit + 1).all()
+    if len(photos) > limit:
+        last = photos[limit - 1]
+        next_cursor = encode_cursor(last.upload_time.isoformat(), last.id)
+    else:
+        next_cursor = None
+    return photos[:limit], next_cursor
+
+
+def paginate_search(query, search_query: str, cursor, limit: int):
+    """Keyset pagination over full-text matches, best match first, by
+       (bm25 rank, id). Returns (photos, next_cursor)."""
+    matches = search.ranked_matches(search_query)
+    if matches is None:
+        return [], None
+    query = query.join(matches, Photo.id == matches.c.photo_id)
+    if cursor:
+        rank, photo_id = decode_cursor(cursor, float)
+        query = query.filter(db.or_(
+            matches.c.rank > rank,
+            db.and_(matches.c.rank == rank, Photo.id > photo_id)
+        ))
+    rows = with_card_relations(query).add_columns(matches.c.rank).order_by(
+        matches.c.rank, Photo.id
+    ).limit(limit + 1).all()
+    if len(rows) > limit:
+        last, rank = rows[limit - 1]
+        next_cursor = encode_cursor(repr(rank), last.id)
+    else:
+        next_cursor = None
+    return [photo for photo, _ in rows[:limit]], next_cursor
 
-def generate_video_thumbnail(video_path: Path, thumb_path: Path) -> None:
-    try:
-        with VideoFileClip(str(video_path)) as clip:
-            t = clip.duration / 2 if clip.duration > 1 else 0.1
-            frame = clip.get_frame(t)
-        img = Image.fromarray(frame)
-        if img.mode != "RGB":
-            img = img.convert("RGB")
-        w, h = img.size
-        new_h = int(h * (THUMB_SIZE_WIDTH / w))
-        img = img.resize((THUMB_SIZE_WIDTH, new_h), Image.Resampling.LANCZOS)
-        thumb_path.parent.mkdir(parents=True, exist_ok=True)
-        img.save(str(thumb_path), format="JPEG")
-    except Exception as e:
-        current_app.logger.error(f"Error generating thumbnail for {video_path}: {e}")
-        raise
 
+def paginate_feed(owner_ids: list, cursor, limit: int):
+    """Keyset pagination over several owners' libraries merged, newest
+       first, by (upload_time, id). Returns (photos, next_cursor)."""
+    keys = merged_keys(owner_ids, decode_cursor(cursor) if cursor else None, limit + 1)
+    by_id = {
+        p.id: p for p in with_card_relations(
+            Photo.query.filter(Photo.id.in_([photo_id for _, photo_id in keys[:limit]]))
+        )
+    }
+    photos = [by_id[photo_id] for _, photo_id in keys[:limit] if photo_id in by_id]
+    if len(keys) > limit:
+        ts, photo_id = keys[limit - 1]
+        next_cursor = encode_cursor(ts.isoformat(), photo_id)
+    else:
+        next_cursor = None
+    return photos, next_cursor
+
+
+def gallery_page_for(owner_id: int, tag_filter: str, search_query: str, cursor, limit: int):
+    """One page of an owner's gallery: ranked when searching through the
+       full-text index, newest first otherwise."""
+    query = gallery_query(owner_id, tag_filter, search_query)
+    if search_query and search.enabled():
+        return paginate_search(query, search_query, cursor, limit)
+    return paginate_gallery(query, cursor, limit)
+
+
+def serialize_photo(photo: Photo) -> dict:
+    """The per-item dict the gallery templates and JSON API render from."""
+    return {
+        "id": photo.id,
+        "status": photo.status,
+        "filename": photo.filename,
+        "description": photo.description,
+        "album": photo.album.title if photo.album else "",
+        "uploader": photo.uploader_alias,
+        "comment_count": photo.comment_count,
+        "tags": [t.name for t in photo.tags],
+        "type": photo.media_type,
+        "owner_id": photo.user_id,
+        **media_urls(photo.filename, photo.user_id),
+    }
 
-def sanitize_filename(filename: str) -> str:
-    clean = secure_filename(filename)
-    if clean != filename:
-        abort(400, "Invalid filename.")
-    return filename
 
+def get_photo(filename: str, owner_id: int) -> Photo:
+    """Fetch the Photo row for a file in the owner's library.
+
+    Files uploaded before the metadata tables existed get a row on first
+    touch; anything not on disk is a 404.
+    """
+    photo = Photo.query.filter_by(filename=filename, user_id=owner_id).first()
+    if photo:
+        return photo
+    path = user_folder(owner_id) / filename
+    if not path.is_file() or not allowed_file(filename):
+        abort(404)
+    owner = db.session.get(User, owner_id)
+    st = path.stat()
+    photo, _ = create_unique(
+        Photo(
+            filename=filename,
+            user_id=owner_id,
+            uploader_alias=owner.username,
+            media_type=media_type_for(filename),
+            file_size=st.st_size,
+            file_mtime=st.st_mtime,
+        ),
+        lambda: Photo.query.filter_by(filename=filename, user_id=owner_id).first()
+    )
+    return photo
+
+
+def uploader_alias_for(owner_id: int) -> str:
+    """Name the current user uploads under in owner_id's gallery; 403 if
+       they may not upload there."""
+    if owner_id == current_user.id:
+        return current_user.username
+    grant = grant_for(current_user, owner_id)
+    if not grant or not grant.can_upload:
+        abort(403)
+    return grant.alias
+
+
+def media_filename(original: str) -> str:
+    """Storage name for an upload: a fresh uuid4 hex keeping the (already
+       allowed_file-checked) extension."""
+    ext = original.rsplit('.', 1)[1].lower()
+    return f"{uuid.uuid4().hex}.{ext}"
+
+
+def find_duplicate(owner_id: int, content_hash: str):
+    return Photo.query.filter_by(user_id=owner_id, content_hash=content_hash).first()
+
+
+def add_media(path: Path, owner_id: int, album, uploader_alias: str, content_hash: str = None):
+    """Record a saved original and queue its processing. Caller commits.
+
+    Returns (photo, job). If the owner already has this content (say the
+    owner and a shared user both uploaded it), the new file is deleted and
+    (existing photo, None) is returned; it only picks up `album` if it
+    isn't in one yet.
+    """
+    existing = find_duplicate(owner_id, content_hash) if content_hash else None
+    if existing is None:
+        st = path.stat()
+        # album_id rather than album=: a photo in album.photos would be
+        # re-added by cascade even if the savepoint rolled it back. Setting
+        # status up front saves an UPDATE (and a reindex) after the insert.
+        photo = Photo(
+            filename=path.name,
+            user_id=owner_id,
+            album_id=album.id if album else None,
+            uploader_alias=uploader_alias,
+            media_type=media_type_for(path.name),
+            status='pending',
+            file_size=st.st_size,
+            file_mtime=st.st_mtime,
+            content_hash=content_hash,
+        )
+        existing, created = create_unique(
+            photo, lambda: find_duplicate(owner_id, content_hash) if content_hash else None
+        )
+        if created:
+            # HEIC conversion and thumbnails happen out-of-band
+            return photo, jobs.enqueue(photo)
+    path.unlink(missing_ok=True)
+    if album is not None and existing.album is None:
+        existing.album = album
+    return existing, None
+
+
+def get_or_create_album(owner_id: int, title: str) -> Album:
+    def lookup():
+        return Album.query.filter_by(owner_id=owner_id, title=title).first()
+
+    album = lookup()
+    if not album:
+        album, _ = create_unique(Album(owner_id=owner_id, title=title), lookup)
+    return album
+
+
+def find_album(owner_id: int, title: str):
+    """Case-insensitive album lookup within one owner's albums."""
+    return Album.query.filter(
+        Album.owner_id == owner_id,
+        db.func.lower(Album.title) == title.strip().lower()
+    ).first()
 
-def user_folder(user_id: int) -> Path:
-    """Get or create the upload folder for a given user."""
-    path = UPLOAD_BASE / str(user_id)
-    path.mkdir(parents=True, exist_ok=True)
-    return path
+
+def favorite_titles(user_id: int) -> list:
+    return [
+        title for (title,) in db.session.query(Album.title)
+        .join(FavoriteAlbum, FavoriteAlbum.album_id == Album.id)
+        .filter(FavoriteAlbum.user_id == user_id)
+    ]
+
+
+def thumb_url(filename: str) -> str:
+    return url_for('main.thumbnail', filename=thumb_name(filename), v=RENDITION_VERSION)
+
+
+def media_urls(filename: str, owner_id: int = None) -> dict:
+    """Grid thumbnail and lightbox URLs for a file; images fall back to the
+       original in the browser if their renditions haven't been built yet,
+       and videos to the original until their streams have been. Files in
+       someone else's library are addressed through their owner."""
+    owner = {"owner_id": owner_id} if owner_id not in (None, current_user.id) else {}
+    original = url_for('main.uploaded_file', filename=filename, **owner)
+    thumb = thumb_url(filename)
+    if media_type_for(filename) == "video":
+        return {
+            "thumb": thumb,
+            "full": url_for('main.stream_file', asset=stream_name(filename),
+                            v=RENDITION_VERSION, **owner),
+            "hls": url_for('main.stream_file', asset=hls_master_name(filename), **owner)
+                   if current_app.config["VIDEO_HLS_HEIGHTS"] else "",
+            "original": original,
+            "preview": url_for('main.preview', filename=preview_name(filename), v=RENDITION_VERSION),
+        }
+    return {
+        "thumb": thumb,
+        "full": url_for('main.lightbox', filename=lightbox_name(filename), v=RENDITION_VERSION),
+        "original": original,
+    }
+
+
+def library_folder(owner_id) -> Path:
+    """The folder to serve owner_id's originals from: the current user's
+       own, or a gallery shared with them. Anything else is a 404, so
+       other libraries can't be probed for filenames."""
+    if owner_id is None or owner_id == current_user.id:
+        return user_folder(current_user.id)
+    if grant_for(current_user, owner_id) is None:
+        abort(404)
+    return user_folder(owner_id)
+
+
+def viewable_photo(filename: str, owner_id):
+    """(photo, grant) for a file the current user may see: one of their
+       own (grant is None) or one in a gallery shared with them. Anything
+       else is a 404, as in library_folder()."""
+    if owner_id is None or owner_id == current_user.id:
+        return get_photo(filename, current_user.id), None
+    grant = grant_for(current_user, owner_id)
+    if grant is None:
+        abort(404)
+    return Photo.query.filter_by(filename=filename, user_id=owner_id).first_or_404(), grant
+
+
+def comments_page(photo: Photo, after: int, limit: int):
+    """A photo's comments after comment id `after`, oldest first: a range
+       scan of the photo_id index. Returns (comments, next_after)."""
+    comments = Comment.query.filter(
+        Comment.photo_id == photo.id, Comment.id > after
+    ).order_by(Comment.id).limit(limit + 1).all()
+    next_after = comments[limit - 1].id if len(comments) > limit else None
+    return comments[:limit], next_after
+
+
+def serialize_comment(comment: Comment) -> dict:
+    return {
+        "id": comment.id,
+        "author": comment.commenter_alias,
+        "text": comment.text,
+        "timestamp": comment.timestamp.isoformat() if comment.timestamp else None,
+    }
 
 
 @main.route("/logout")
@@ -96,214 +380,239 @@ def logout():
 
 @main.route("/")
 @login_required
+@cached_page
 def index():
-    """Gallery view: shows current user's media plus galleries they've been shared."""
-    descs    = load_json(DESCRIPTION_PATH)
-    albums   = load_json(ALBUM_PATH)
-    comments = load_json(COMMENTS_PATH)
-    tags     = load_json(TAGS_PATH)
-
+    """Gallery view: first page of the current user's media; the rest is
+       fetched from gallery_page() as the user scrolls."""
     tag_filter   = request.args.get("tag", "").strip().lower()
     search_query = request.args.get("search", "").strip().lower()
 
-    UPLOAD_FOLDER = user_folder(current_user.id)
-    media_files = sorted(
-        [f for f in UPLOAD_FOLDER.iterdir() if f.is_file()],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
+    photos, next_cursor = gallery_page_for(
+        current_user.id, tag_filter, search_query,
+        None,
+        current_app.config["GALLERY_PAGE_SIZE"]
     )
 
-    images = []
-    for path in media_files:
-        fn  = path.name
-        ext = path.suffix.lstrip('.').lower()
-        file_tags = tags.get(fn, [])
-        lt = [t.lower() for t in file_tags]
-
-        if tag_filter and tag_filter not in lt:
-            continue
-        if search_query and not (
-            search_query in fn.lower()
-            or search_query in descs.get(fn, "").lower()
-            or search_query in albums.get(fn, "").lower()
-            or any(search_query in t.lower() for t in file_tags)
-        ):
-            continue
-
-        media_type = "video" if ext in VIDEO_EXTENSIONS else "image"
-        thumb = (
-            url_for('main.thumbnail', filename=f"{path.stem}.jpg")
-            if media_type == "video"
-            else url_for('main.uploaded_file', filename=fn)
-        )
+    return render_template(
+        "gallery.html",
+        images=[serialize_photo(p) for p in photos],
+        next_cursor=next_cursor,
+        tag_cloud=tags.tag_cloud(current_user.id),
+        current_tag=tag_filter,
+        search_query=search_query,
+        favorites=favorite_titles(current_user.id)
+    )
 
-        images.append({
-            "filename": fn,
-            "description": descs.get(fn, ""),
-            "album": albums.get(fn, ""),
-            "comments": comments.get(fn, []),
-            "tags": file_tags,
-            "type": media_type,
-            "thumb": thumb,
-        })
 
-    all_tags = sorted({t for lst in tags.values() for t in lst}, key=str.lower)
+@main.route("/api/gallery")
+@login_required
+def gallery_page():
+    """JSON page of gallery items after `cursor`, for infinite scroll."""
+    tag_filter   = request.args.get("tag", "").strip().lower()
+    search_query = request.args.get("search", "").strip().lower()
+    limit = min(
+        request.args.get("limit", current_app.config["GALLERY_PAGE_SIZE"], type=int),
+        current_app.config["GALLERY_MAX_PAGE_SIZE"]
+    )
+
+    photos, next_cursor = gallery_page_for(
+        current_user.id, tag_filter, search_query,
+        request.args.get("cursor"),
+        max(limit, 1)
+    )
+    images = [serialize_photo(p) for p in photos]
 
-    shared_accesses = SharedAccess.query.filter_by(
-        shared_user_id=current_user.id
-    ).all()
+    return jsonify({
+        "items": images,
+        "html": render_template(
+            "_gallery_cards.html",
+            images=images
+        ),
+        "next_cursor": next_cursor,
+    })
 
-    favorites_map = load_json(ALBUM_PATH).get("favorites", {})
-    user_favorites = favorites_map.get(str(current_user.id), [])
 
+@main.route("/feed")
+@login_required
+def feed():
+    """The current user's media and every gallery shared with them, newest
+       first; the rest is fetched from feed_page() as the user scrolls."""
+    grants = grants_for(current_user)
+    photos, next_cursor = paginate_feed(
+        feed_owner_ids(current_user, grants), None,
+        current_app.config["GALLERY_PAGE_SIZE"]
+    )
     return render_template(
         "gallery.html",
-        images=images,
-        descriptions=descs,
-        albums=albums,
-        tags=tags,
-        all_tags=all_tags,
-        current_tag=tag_filter,
-        search_query=search_query,
-        shared_accesses=shared_accesses,
-        favorites=user_favorites
+        images=[serialize_photo(p) for p in photos],
+        next_cursor=next_cursor,
+        page_url=url_for('main.feed_page'),
+        title="Feed",
+        grants=grants,
+        favorites=favorite_titles(current_user.id)
     )
 
 
-@main.route("/albums")
+@main.route("/api/feed")
 @login_required
-def albums():
-    """Albums view: dynamically list albums with counts and preview thumbnails."""
-    raw_data = load_json(ALBUM_PATH)
-    albums_map = {k: v for k, v in raw_data.items() if k != "favorites"}
-
-    UPLOAD_FOLDER = user_folder(current_user.id)
-    media_files = sorted(
-        [f for f in UPLOAD_FOLDER.iterdir() if f.is_file() and allowed_file(f.name)],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
+def feed_page():
+    """JSON page of feed items after `cursor`, for infinite scroll."""
+    limit = min(
+        request.args.get("limit", current_app.config["GALLERY_PAGE_SIZE"], type=int),
+        current_app.config["GALLERY_MAX_PAGE_SIZE"]
+    )
+    grants = grants_for(current_user)
+    photos, next_cursor = paginate_feed(
+        feed_owner_ids(current_user, grants),
+        request.args.get("cursor"),
+        max(limit, 1)
     )
+    images = [serialize_photo(p) for p in photos]
 
-    album_titles = sorted({v for v in albums_map.values()}, key=str.lower)
-    grouped = {title: [] for title in album_titles}
+    return jsonify({
+        "items": images,
+        "html": render_template(
+            "_gallery_cards.html",
+            images=images,
+            grants=grants
+        ),
+        "next_cursor": next_cursor,
+    })
 
-    for f in media_files:
-        fn = f.name
-        title = albums_map.get(fn, "")
-        if title in grouped:
-            grouped[title].append(f)
 
-    albums_data = []
-    for title in album_titles:
-        files = grouped.get(title, [])
-        photos = sum(1 for f in files if f.suffix.lstrip('.').lower() in IMAGE_EXTENSIONS)
-        videos = sum(1 for f in files if f.suffix.lstrip('.').lower() in VIDEO_EXTENSIONS)
-
-        thumbnails = []
-        for f in files[:5]:
-            ext = f.suffix.lstrip('.').lower()
-            if ext in VIDEO_EXTENSIONS:
-                thumbnails.append(url_for('main.thumbnail', filename=f"{f.stem}.jpg"))
-            else:
-                thumbnails.append(url_for('main.uploaded_file', filename=f.name))
+@main.route("/albums")
+@login_required
+@cached_page
+def albums():
+    """Albums view: every album with its counts and preview thumbnails,
+       read from the precomputed aggregates (see aggregates.py)."""
+    user_albums = Album.query.filter_by(owner_id=current_user.id).all()
 
+    albums_data = []
+    for album in sorted(user_albums, key=lambda a: a.title.lower()):
         albums_data.append({
-            "title": title,
-            "photos": photos,
-            "videos": videos,
-            "thumbnails": thumbnails
+            "title": album.title,
+            "photos": album.photo_count,
+            "videos": album.video_count,
+            "thumbnails": [thumb_url(fn) for fn in album.cover_filenames or []],
+            "updated_at": album.updated_at,
         })
 
-    favorites_map = raw_data.get("favorites", {})
-    user_favorites = favorites_map.get(str(current_user.id), [])
-
-    return render_template("albums.html", albums_data=albums_data, favorites=user_favorites)
+    return render_template(
+        "albums.html",
+        albums_data=albums_data,
+        favorites=favorite_titles(current_user.id)
+    )
 
 
 @main.route("/album/<album_title>")
 @login_required
+@cached_page
 def view_album(album_title):
     """Show all media in a specific album for the current user."""
-    descs    = load_json(DESCRIPTION_PATH)
-    albums   = load_json(ALBUM_PATH)
-    comments = load_json(COMMENTS_PATH)
-    tags     = load_json(TAGS_PATH)
-
     # decode and normalize the album title for case-insensitive matching
-    decoded_title = unquote(album_title).strip().lower()
-    actual_album_title = next(
-        (v for v in albums.values() if isinstance(v, str) and v.strip().lower() == decoded_title),
-        None
-    )
+    album = find_album(current_user.id, unquote(album_title))
 
-    if not actual_album_title:
+    if not album:
         flash(f"No album found named '{unquote(album_title)}'", "error")
         return redirect(url_for("main.albums"))
 
-    UPLOAD_FOLDER = user_folder(current_user.id)
-    media_files = sorted(
-        [
-            f for f in UPLOAD_FOLDER.iterdir()
-            if f.is_file()
-            and allowed_file(f.name)
-            and albums.get(f.name) == actual_album_title
-        ],
-        key=lambda p: p.stat().st_mtime,
-        reverse=True
+    photos = with_card_relations(Photo.query.filter_by(album_id=album.id)).order_by(
+        Photo.upload_time.desc(), Photo.id.desc()
     )
 
-    media = []
-    for path in media_files:
-        fn  = path.name
-        ext = path.suffix.lstrip('.').lower()
-        media_type = "video" if ext in VIDEO_EXTENSIONS else "image"
-        thumb = (
-            url_for('main.thumbnail', filename=f"{path.stem}.jpg")
-            if media_type == "video"
-            else url_for('main.uploaded_file', filename=fn)
-        )
-        media.append({
-            "filename": fn,
-            "description": descs.get(fn, ""),
-            "tags": tags.get(fn, []),
-            "comments": comments.get(fn, []),
-            "type": media_type,
-            "thumb": thumb
-        })
+    media = [serialize_photo(p) for p in photos]
 
     return render_template(
         "album_view.html",
-        # pass the decoded, actual album title so spaces render correctly
-        album_title=actual_album_title,
+        # pass the actual album title so spaces and casing render correctly
+        album_title=album.title,
         media_items=media
     )
 
 
+@main.route("/album/<album_title>/similar")
+@login_required
+@cached_page
+def album_similar(album_title):
+    """Near-duplicate groups (bursts, retakes) within one album."""
+    album = find_album(current_user.id, unquote(album_title))
+    if not album:
+        flash(f"No album found named '{unquote(album_title)}'", "error")
+        return redirect(url_for("main.albums"))
+
+    # oldest first, so a burst reads in the order it was shot
+    photos = Photo.query.filter(
+        Photo.album_id == album.id,
+        Photo.status == 'ready',
+        Photo.phash.isnot(None),
+    ).order_by(Photo.upload_time, Photo.id).all()
+    groups = similar.group_near_duplicates(photos, current_app.config["NEAR_DUPLICATE_DISTANCE"])
+
+    return render_template(
+        "album_similar.html",
+        album_title=album.title,
+        groups=[
+            [{"filename": p.filename, "description": p.description, **media_urls(p.filename)}
+             for p in group]
+            for group in groups
+        ]
+    )
+
+
+@main.route("/similar/<filename>")
+@login_required
+def similar_photos(filename):
+    """JSON list of the current user's photos that nearly duplicate one."""
+    fn = sanitize_filename(filename)
+    photo = get_photo(fn, current_user.id)
+    matches = similar.near_duplicates(photo, current_app.config["NEAR_DUPLICATE_DISTANCE"])
+    return jsonify([
+        {"filename": p.filename, "distance": distance, "thumb": thumb_url(p.filename)}
+        for distance, p in matches
+    ])
+
+
+@main.route("/media/status")
+@login_required
+def media_status():
+    """Processing status for the placeholders the gallery is waiting on."""
+    ids = [int(i) for i in request.args.get("ids", "").split(",") if i.isdigit()]
+    if not ids:
+        return jsonify({})
+    # the feed shows files from shared galleries too
+    owner_ids = feed_owner_ids(current_user, grants_for(current_user))
+    photos = Photo.query.filter(Photo.id.in_(ids), Photo.user_id.in_(owner_ids))
+    return jsonify({
+        str(p.id): {
+            "status": p.status,
+            "filename": p.filename,
+            "type": p.media_type,
+            **(media_urls(p.filename, p.user_id) if p.status == "ready" else {}),
+        }
+        for p in photos
+    })
+
+
 @main.route("/create_album", methods=["POST"])
 @login_required
 def create_album():
-    """Create a new empty album entry, preserving favorites."""
+    """Create a new empty album for the current user."""
     name = request.form.get("title", "").strip()
     if not name:
         flash("Album name cannot be empty.", "error")
     elif len(name) > 50:
         flash("Album name must be 50 characters or fewer.", "error")
     else:
-        data = load_json(ALBUM_PATH)
-        favorites = data.get("favorites")
-        albums_map = {k: v for k, v in data.items() if k != "favorites"}
-        existing = set(albums_map.values())
-
-        if name in existing:
-            flash(f"Album '{name}' already exists.", "info")
-        else:
-            # adding a placeholder mapping so the album shows even if empty
-            albums_map[name] = name
-            new_data = dict(albums_map)
-            if favorites is not None:
-                new_data["favorites"] = favorites
-            save_json(ALBUM_PATH, new_data)
+        _, created = create_unique(
+            Album(owner_id=current_user.id, title=name),
+            lambda: Album.query.filter_by(owner_id=current_user.id, title=name).first()
+        )
+        db.session.commit()
+        if created:
             flash(f"Album '{name}' created.", "success")
+        else:
+            flash(f"Album '{name}' already exists.", "info")
 
     return redirect(url_for("main.albums"))
 
@@ -313,87 +622,49 @@ def create_album():
 def upload():
     """Upload handler: shared or owner uploads with alias tagging,
        plus album selection and new-album creation support."""
-    shared_accesses = SharedAccess.query.filter_by(
-        shared_user_id=current_user.id
-    ).all()
-    albums_map = load_json(ALBUM_PATH)
-    album_titles = sorted(
-        {v for k, v in albums_map.items() if k != "favorites"},
-        key=str.lower
-    )
-
     if request.method == "POST":
         owner_id = int(request.form.get("owner_id", current_user.id))
-        if owner_id != current_user.id:
-            access = SharedAccess.query.filter_by(
-                owner_id=owner_id,
-                shared_user_id=current_user.id
-            ).first()
-            if not access or not access.can_upload:
-                abort(403)
-            uploader_alias = access.alias
-        else:
-            uploader_alias = current_user.username
+        uploader_alias = uploader_alias_for(owner_id)
 
         files = request.files.getlist("photos")
         album = request.form.get("album", "").strip()
         new_album = request.form.get("new_album", "").strip()
         chosen_album = new_album or album
-
-        descs    = load_json(DESCRIPTION_PATH)
-        albums   = load_json(ALBUM_PATH)
-        comments = load_json(COMMENTS_PATH)
-        tags     = load_json(TAGS_PATH)
+        target_album = get_or_create_album(owner_id, chosen_album) if chosen_album else None
 
         UPLOAD_FOLDER = user_folder(owner_id)
 
+        new_jobs, duplicates = [], []
         for file in files:
             if file and allowed_file(file.filename):
-                orig = secure_filename(file.filename)
-                ext  = orig.rsplit('.', 1)[1].lower()
-                filename = f"{uuid.uuid4().hex}.{ext}"
-                save_path = UPLOAD_FOLDER / filename
-
-                if ext == 'heic':
-                    try:
-                        hf = pillow_heif.read_heif(file.stream)
-                        img = Image.frombytes(hf.mode, hf.size, hf.data, 'raw')
-                        filename = f"{uuid.uuid4().hex}.jpg"
-                        save_path = UPLOAD_FOLDER / filename
-                        img.save(str(save_path), format='JPEG')
-                        flash('HEIC converted and uploaded.', 'success')
-                    except Exception as e:
-                        flash(f'HEIC conversion failed: {e}', 'error')
-                        continue
-                else:
-                    file.save(str(save_path))
-
-                if ext in VIDEO_EXTENSIONS:
-                    thumb_file = THUMB_FOLDER / f"{save_path.stem}.jpg"
-                    try:
-                        generate_video_thumbnail(save_path, thumb_file)
-                    except Exception as e:
-                        flash(f"Thumbnail failed for {filename}: {e}", 'error')
-
-                if chosen_album:
-                    albums[filename] = chosen_album
-                descs.setdefault(filename, "")
-                comments.setdefault(filename, [])
-                tags.setdefault(filename, [])
-
-                comments[filename].insert(0, f"Uploaded by {uploader_alias}")
-
-        save_json(DESCRIPTION_PATH, descs)
-        save_json(ALBUM_PATH, albums)
-        save_json(COMMENTS_PATH, comments)
-        save_json(TAGS_PATH, tags)
-
+                path = UPLOAD_FOLDER / media_filename(file.filename)
+                started = time.perf_counter()
+                content_hash = save_stream(file.stream, path)
+                _, job = add_media(path, owner_id, target_album, uploader_alias, content_hash)
+                if job is None:
+                    duplicates.append(file.filename)
+                    continue
+                job.timings = {"save": round(time.perf_counter() - started, 3)}
+                new_jobs.append(job)
+
+        db.session.commit()
+
+        if current_app.config["MEDIA_WORKER_MODE"] == "inline":
+            for job in jobs.run_inline(new_jobs):
+                flash(f"Processing failed for {job.photo.filename}: {job.error}", 'error')
+
+        if duplicates:
+            flash(f"Already in the gallery, so not stored again: {', '.join(duplicates)}", 'info')
         flash('Upload successful.', 'success')
         return redirect(url_for('main.index'))
 
+    album_titles = sorted(
+        (title for (title,) in db.session.query(Album.title).filter_by(owner_id=current_user.id)),
+        key=str.lower
+    )
     return render_template(
         'upload.html',
-        shared_accesses=shared_accesses,
+        shared_accesses=shared_galleries(current_user),
         album_titles=album_titles
     )
 
@@ -402,13 +673,19 @@ def upload():
 @login_required
 def add_tag(filename):
     fn = sanitize_filename(filename)
-    tags = load_json(TAGS_PATH)
     new = request.form.get("tag", "").strip()
-    if new:
-        tags.setdefault(fn, [])
-        if new not in tags[fn]:
-            tags[fn].append(new)
-            save_json(TAGS_PATH, tags)
+    if len(new) > tags.MAX_TAG_LENGTH:
+        flash(f"Tags must be {tags.MAX_TAG_LENGTH} characters or fewer.", 'warning')
+    elif new:
+        photo = get_photo(fn, current_user.id)
+        created = False
+        if new.lower() not in {t.name_lower for t in photo.tags}:
+            _, created = create_unique(
+                Tag(photo_id=photo.id, name=new, owner_id=current_user.id),
+                lambda: Tag.query.filter_by(photo_id=photo.id, name_lower=new.lower()).first()
+            )
+            db.session.commit()
+        if created:
             flash(f"Tag '{new}' added.", 'success')
         else:
             flash(f"Tag '{new}' exists.", 'info')
@@ -421,10 +698,10 @@ def add_tag(filename):
 @login_required
 def remove_tag(filename, tag):
     fn = sanitize_filename(filename)
-    tags = load_json(TAGS_PATH)
-    tags.setdefault(fn, [])
-    tags[fn] = [t for t in tags[fn] if t.lower() != tag.lower()]
-    save_json(TAGS_PATH, tags)
+    photo = get_photo(fn, current_user.id)
+    for t in [t for t in photo.tags if t.name_lower == tag.lower()]:
+        photo.tags.remove(t)
+    db.session.commit()
     flash(f"Tag '{tag}' removed.", 'success')
     return redirect(url_for('main.index'))
 
@@ -438,11 +715,19 @@ def rename_tag_single():
     if not old or not new:
         flash("Missing rename data.", 'warning')
         return redirect(url_for('main.index'))
+    if len(new) > tags.MAX_TAG_LENGTH:
+        flash(f"Tags must be {tags.MAX_TAG_LENGTH} characters or fewer.", 'warning')
+        return redirect(url_for('main.index'))
 
-    tags = load_json(TAGS_PATH)
-    tags.setdefault(fn, [])
-    tags[fn] = [new if t.lower() == old else t for t in tags[fn]]
-    save_json(TAGS_PATH, tags)
+    photo = get_photo(fn, current_user.id)
+    existing = {t.name_lower: t for t in photo.tags}
+    if old in existing:
+        if new.lower() in existing and new.lower() != old:
+            # renaming onto a tag the file already has just merges them
+            db.session.delete(existing[old])
+        else:
+            existing[old].name = new
+        db.session.commit()
     flash(f"Renamed '{old}'→'{new}' on {fn}.", 'success')
     return redirect(url_for('main.index'))
 
@@ -455,17 +740,25 @@ def rename_tag_global():
     if not old or not new:
         flash("Missing rename data.", 'warning')
         return redirect(url_for('main.index'))
+    if len(new) > tags.MAX_TAG_LENGTH:
+        flash(f"Tags must be {tags.MAX_TAG_LENGTH} characters or fewer.", 'warning')
+        return redirect(url_for('main.index'))
 
-    tags = load_json(TAGS_PATH)
-    updated = False
-    for fn, lst in tags.items():
-        new_lst = [new if t.lower() == old else t for t in lst]
-        if new_lst != lst:
-            tags[fn] = new_lst
-            updated = True
-
-    if updated:
-        save_json(TAGS_PATH, tags)
+    matches = Tag.query.filter_by(owner_id=current_user.id, name_lower=old).all()
+    if matches:
+        already_tagged = {
+            photo_id for (photo_id,) in db.session.query(Tag.photo_id).filter(
+                Tag.owner_id == current_user.id,
+                Tag.name_lower == new.lower(),
+                Tag.name_lower != old
+            )
+        }
+        for tag in matches:
+            if tag.photo_id in already_tagged:
+                db.session.delete(tag)
+            else:
+                tag.name = new
+        db.session.commit()
         flash(f"Renamed '{old}'→'{new}' globally.", 'success')
     else:
         flash(f"No matches for '{old}'.", 'info')
@@ -484,51 +777,123 @@ def delete_image(filename):
     fn = sanitize_filename(filename)
     UPLOAD_FOLDER = user_folder(current_user.id)
     fp = UPLOAD_FOLDER / fn
-    tp = THUMB_FOLDER / f"{Path(fn).stem}.jpg"
-
-    descs    = load_json(DESCRIPTION_PATH)
-    albums   = load_json(ALBUM_PATH)
-    comments = load_json(COMMENTS_PATH)
-    tags     = load_json(TAGS_PATH)
 
     if fp.exists():
         fp.unlink()
-        descs.pop(fn, None)
-        albums.pop(fn, None)
-        comments.pop(fn, None)
-        tags.pop(fn, None)
-        if tp.exists():
-            tp.unlink()
+        photo = Photo.query.filter_by(filename=fn, user_id=current_user.id).first()
+        if photo:
+            db.session.delete(photo)
+            db.session.commit()
+        remove_renditions(fn)
+        remove_streams(fp)
         flash(f"{fn} deleted.", 'success')
     else:
         flash(f"{fn} not found.", 'error')
 
-    save_json(DESCRIPTION_PATH, descs)
-    save_json(ALBUM_PATH, albums)
-    save_json(COMMENTS_PATH, comments)
-    save_json(TAGS_PATH, tags)
     return redirect(url_for('main.index'))
 
 
 @main.route("/download/<filename>")
+@main.route("/shared/<int:owner_id>/download/<filename>")
 @login_required
-def download_image(filename):
+def download_image(filename, owner_id=None):
     fn = sanitize_filename(filename)
-    UPLOAD_FOLDER = user_folder(current_user.id)
-    return send_from_directory(str(UPLOAD_FOLDER), fn, as_attachment=True)
+    return send_media(library_folder(owner_id), fn, as_attachment=True, immutable=True)
 
 
 @main.route("/update_description/<filename>", methods=["POST"])
 @login_required
 def update_description(filename):
     fn = sanitize_filename(filename)
-    descs = load_json(DESCRIPTION_PATH)
-    descs[fn] = request.form.get("description", "").strip()
-    save_json(DESCRIPTION_PATH, descs)
+    photo = get_photo(fn, current_user.id)
+    photo.description = request.form.get("description", "").strip()
+    db.session.commit()
     flash("Description updated.", 'success')
     return redirect(url_for('main.index'))
 
 
+@main.route("/api/bulk", methods=["POST"])
+@login_required
+def bulk_edit():
+    """Tag, untag, move, describe or delete many files in one transaction
+       (see bulk.py). Returns the edited files' cards, re-rendered."""
+    try:
+        filenames, ops = bulk.parse(
+            request.get_json(silent=True) or {}, current_app.config["BULK_MAX_FILES"]
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    filenames = [sanitize_filename(fn) for fn in filenames]
+    photos = bulk.load(current_user.id, filenames)
+    found = {p.filename for p in photos}
+    deleted = [p.filename for p in bulk.apply(current_user.id, photos, ops)]
+    edited = [] if deleted else [p.id for p in photos]
+    db.session.commit()
+
+    folder = user_folder(current_user.id)
+    for fn in deleted:
+        (folder / fn).unlink(missing_ok=True)
+        remove_renditions(fn)
+        remove_streams(folder / fn)
+
+    images = [
+        serialize_photo(p) for p in with_card_relations(
+            Photo.query.filter(Photo.id.in_(edited))
+        ).order_by(Photo.upload_time.desc(), Photo.id.desc())
+    ] if edited else []
+    return jsonify({
+        "status": "success",
+        "updated": [img["filename"] for img in images],
+        "deleted": deleted,
+        "missing": [fn for fn in filenames if fn not in found],
+        "html": render_template(
+            "_gallery_cards.html",
+            images=images
+        ),
+    })
+
+
+@main.route("/api/photo/<filename>/panel")
+@main.route("/shared/<int:owner_id>/api/photo/<filename>/panel")
+@login_required
+def photo_panel(filename, owner_id=None):
+    """A card's comments and editing forms, fetched when the card (not the
+       gallery page) is opened, with the first page of comments."""
+    photo, grant = viewable_photo(sanitize_filename(filename), owner_id)
+    comments, next_after = comments_page(photo, 0, current_app.config["COMMENTS_PAGE_SIZE"])
+    return jsonify({
+        "html": render_template(
+            "_photo_panel.html",
+            img=serialize_photo(photo),
+            grant=grant,
+            comments=[serialize_comment(c) for c in comments],
+            more_url=url_for('main.photo_comments', filename=photo.filename,
+                             owner_id=owner_id if grant else None, after=next_after)
+                     if next_after else None,
+            shared_accesses=[] if grant else shared_galleries(current_user)
+        ),
+    })
+
+
+@main.route("/api/photo/<filename>/comments")
+@main.route("/shared/<int:owner_id>/api/photo/<filename>/comments")
+@login_required
+def photo_comments(filename, owner_id=None):
+    """JSON page of a photo's comments after comment id `after`, oldest first."""
+    photo, grant = viewable_photo(sanitize_filename(filename), owner_id)
+    comments, next_after = comments_page(
+        photo, request.args.get("after", 0, type=int), current_app.config["COMMENTS_PAGE_SIZE"]
+    )
+    return jsonify({
+        "uploader": photo.uploader_alias,
+        "items": [serialize_comment(c) for c in comments],
+        "next_url": url_for('main.photo_comments', filename=photo.filename,
+                            owner_id=owner_id if grant else None, after=next_after)
+                    if next_after else None,
+    })
+
+
 @main.route("/add_comment/<filename>", methods=["POST"])
 @login_required
 def add_comment(filename):
@@ -540,20 +905,16 @@ def add_comment(filename):
 
     owner_id = int(request.form.get("owner_id", current_user.id))
     if owner_id != current_user.id:
-        access = SharedAccess.query.filter_by(
-            owner_id=owner_id,
-            shared_user_id=current_user.id
-        ).first()
-        if not access or not access.can_comment:
+        grant = grant_for(current_user, owner_id)
+        if not grant or not grant.can_comment:
             abort(403)
-        commenter_alias = access.alias
+        commenter_alias = grant.alias
     else:
         commenter_alias = current_user.username
 
-    comments = load_json(COMMENTS_PATH)
-    comments.setdefault(fn, [])
-    comments[fn].append(f"{commenter_alias} — {comment_text}")
-    save_json(COMMENTS_PATH, comments)
+    photo = get_photo(fn, owner_id)
+    db.session.add(Comment(photo=photo, commenter_alias=commenter_alias, text=comment_text))
+    db.session.commit()
 
     flash("Comment added.", 'success')
     return redirect(url_for('main.index'))
@@ -594,43 +955,92 @@ def share():
 
 
 @main.route("/uploads/<filename>")
+@main.route("/shared/<int:owner_id>/uploads/<filename>")
 @login_required
-def uploaded_file(filename):
+def uploaded_file(filename, owner_id=None):
     fn = sanitize_filename(filename)
-    user_dir = user_folder(current_user.id)
-    return send_from_directory(str(user_dir), fn)
+    return send_media(library_folder(owner_id), fn, immutable=True)
+
+
+# the owner is part of the path, not the query, so the relative URLs
+# inside HLS playlists resolve to the same owner
+@main.route("/uploads/streams/<path:asset>")
+@main.route("/shared/<int:owner_id>/uploads/streams/<path:asset>")
+@login_required
+def stream_file(asset, owner_id=None):
+    """A video's faststart MP4 or HLS files, under the same library check
+       as uploaded_file. Segments never change once written; playlists
+       are revalidated, since they're rewritten on a re-transcode."""
+    parts = [sanitize_filename(part) for part in asset.split("/")]
+    stream_dir = library_folder(owner_id) / STREAM_FOLDER
+    return send_media(stream_dir, "/".join(parts), immutable=not asset.endswith(".m3u8"))
+
+
+def check_rendition(name: str) -> None:
+    """404 unless the current user may see the file a rendition was made
+       from. Renditions are named after the original's stem, so this is
+       one range lookup on the filename index plus library_folder()'s
+       ownership or grant check."""
+    stem = Path(name).stem
+    # every "<stem>.<ext>": '.' and '/' are adjacent characters
+    owner_id = db.session.scalar(
+        db.select(Photo.user_id)
+        .where(Photo.filename > f"{stem}.", Photo.filename < f"{stem}/")
+        .limit(1)
+    )
+    if owner_id is None:
+        abort(404)
+    library_folder(owner_id)
 
 
 @main.route("/thumbnails/<filename>")
 @login_required
 def thumbnail(filename):
     fn = sanitize_filename(filename)
-    return send_from_directory(str(THUMB_FOLDER), fn)
+    check_rendition(fn)
+    return send_media(THUMB_FOLDER, fn, immutable=True)
+
+
+@main.route("/lightbox/<filename>")
+@login_required
+def lightbox(filename):
+    fn = sanitize_filename(filename)
+    check_rendition(fn)
+    return send_media(LIGHTBOX_FOLDER, fn, immutable=True)
+
+
+@main.route("/previews/<filename>")
+@login_required
+def preview(filename):
+    fn = sanitize_filename(filename)
+    check_rendition(fn)
+    return send_media(PREVIEW_FOLDER, fn, immutable=True)
 
 
 @main.route("/toggle_favorite_album", methods=["POST"])
 @login_required
 def toggle_favorite_album():
     """Toggle favorite status for an album for the current user."""
-    album = request.form.get("album", "").strip()
-    if not album:
+    title = request.form.get("album", "").strip()
+    if not title:
         return jsonify({"status": "error", "message": "No album specified"}), 400
 
-    data = load_json(ALBUM_PATH)
-    favorites = data.get("favorites", {})
-    user_id_str = str(current_user.id)
-    user_favs = favorites.get(user_id_str, [])
+    album = Album.query.filter_by(owner_id=current_user.id, title=title).first()
+    if not album:
+        return jsonify({"status": "error", "message": "Album not found"}), 404
 
-    if album in user_favs:
-        user_favs.remove(album)
+    fav = db.session.get(FavoriteAlbum, (current_user.id, album.id))
+    if fav:
+        db.session.delete(fav)
         action = "unfavorited"
     else:
-        user_favs.append(album)
+        # a double-click racing itself just leaves the album favorited
+        create_unique(
+            FavoriteAlbum(user_id=current_user.id, album_id=album.id),
+            lambda: db.session.get(FavoriteAlbum, (current_user.id, album.id))
+        )
         action = "favorited"
-
-    favorites[user_id_str] = user_favs
-    data["favorites"] = favorites
-    save_json(ALBUM_PATH, data)
+    db.session.commit()
 
     return jsonify({"status": "success", "action": action})
 
@@ -645,29 +1055,13 @@ def delete_album():
     if not album_title:
         return jsonify({"error": "Missing album title"}), 400
 
-    # Load albums.json
-    try:
-        with open(ALBUM_PATH, "r") as f:
-            albums = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        albums = {}
-
-    # Remove all media entries with the matching album title
-    albums_to_keep = {
-        k: v for k, v in albums.items()
-        if v != album_title and k != "favorites"
-    }
-
-    # Preserve favorites
-    favorites = albums.get("favorites", {})
-    uid = str(current_user.id)
-    if uid in favorites:
-        favorites[uid] = [t for t in favorites[uid] if t != album_title]
-
-    # Save updated data
-    albums_to_keep["favorites"] = favorites
-    with open(ALBUM_PATH, "w") as f:
-        json.dump(albums_to_keep, f, indent=2)
+    album = Album.query.filter_by(owner_id=current_user.id, title=album_title).first()
+    if album:
+        # media stays in the library, it just no longer belongs to an album
+        for photo in list(album.photos):
+            photo.album = None
+        db.session.delete(album)
+        db.session.commit()
 
     return jsonify({"success": True}), 200
 
@@ -675,39 +1069,29 @@ def delete_album():
 @main.route("/rename_album/<album_title>", methods=["POST"])
 @login_required
 def rename_album(album_title):
-    """Rename an album across all entries and favorites, handling URL encoding."""
+    """Rename an album, handling URL encoding; renaming onto an existing
+       album merges the two."""
     old_title = unquote(album_title).strip()
     payload = request.get_json(silent=True) or {}
     new_title = payload.get("new_title", "").strip()
     if not new_title:
         return jsonify({"status": "error", "message": "No new title provided"}), 400
 
-    # Load existing albums data
-    data = load_json(ALBUM_PATH)
-    favorites = data.get("favorites", {})
-
-    # Build updated mapping (including placeholder entries)
-    updated_map = {}
-    for key, value in data.items():
-        if key == "favorites":
-            continue
-        # placeholder album entry (key == value == old_title)
-        if key == old_title and value == old_title:
-            updated_map[new_title] = new_title
-        # file entries matching the old album title
-        elif value == old_title:
-            updated_map[key] = new_title
-        else:
-            updated_map[key] = value
-
-    # Update favorites for all users
-    for user_id, fav_list in favorites.items():
-        favorites[user_id] = [new_title if t == old_title else t for t in fav_list]
-
-    # Save updated data
-    result = dict(updated_map)
-    result["favorites"] = favorites
-    save_json(ALBUM_PATH, result)
+    album = Album.query.filter_by(owner_id=current_user.id, title=old_title).first()
+    if not album:
+        return jsonify({"status": "error", "message": "Album not found"}), 404
+
+    target = Album.query.filter_by(owner_id=current_user.id, title=new_title).first()
+    if target and target.id != album.id:
+        for photo in list(album.photos):
+            photo.album = target
+        favorited_by = {f.user_id for f in target.favorites}
+        for fav in album.favorites:
+            if fav.user_id not in favorited_by:
+                db.session.add(FavoriteAlbum(user_id=fav.user_id, album_id=target.id))
+        db.session.delete(album)
+    else:
+        album.title = new_title
+    db.session.commit()
 
     return jsonify({"status": "success"}), 200
-
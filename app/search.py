@@ -0,0 +1,132 @@
+"""Full-text search over photo metadata, backed by an SQLite FTS5 table.
+
+photo_search holds one row per photo (rowid = photo.id) with its
+filename, description, album title, tag names and comment text. Rows are
+rewritten in the same transaction as the change that affects them: an
+after_flush hook looks at the Photo, Tag, Comment and Album objects the
+flush touched, so the mutation routes don't have to remember to call in
+here. Bulk Query.update()/delete() bypass the hook, which is why the
+routes that change tags, comments or album membership use ORM operations.
+
+On databases without FTS5 enabled() is False and the gallery falls back to
+its substring filter.
+"""
+import re
+
+from flask import current_app
+from sqlalchemy import DDL, event, inspect
+
+from .models import db, Photo, Tag, Comment, Album
+
+# column weights for bm25(): filename, description, album, tags, comments
+RANK_WEIGHTS = (0.5, 2.0, 3.0, 4.0, 1.0)
+
+CREATE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS photo_search USING fts5("
+    "filename, description, album, tags, comments, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+_ROWS_SQL = """
+    SELECT p.id, p.filename, p.description, COALESCE(a.title, ''),
+           COALESCE((SELECT group_concat(t.name, ' ') FROM tag t WHERE t.photo_id = p.id), ''),
+           COALESCE((SELECT group_concat(c.text, ' ') FROM comment c WHERE c.photo_id = p.id), '')
+    FROM photo p LEFT JOIN album a ON a.id = p.album_id
+"""
+INSERT_ROWS = (
+    "INSERT INTO photo_search (rowid, filename, description, album, tags, comments)"
+    + _ROWS_SQL
+)
+
+# create_all() builds the index alongside the photo table; migrations do it themselves
+event.listen(Photo.__table__, "after_create", DDL(CREATE_TABLE).execute_if(dialect="sqlite"))
+event.listen(
+    Photo.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS photo_search").execute_if(dialect="sqlite")
+)
+
+_fts = db.table("photo_search", db.column("rowid"))
+
+
+def enabled() -> bool:
+    """Whether this app's database has the FTS index (checked once per app)."""
+    state = current_app.extensions.get("photo_search")
+    if state is None:
+        engine = db.engine
+        state = engine.dialect.name == "sqlite" and inspect(engine).has_table("photo_search")
+        current_app.extensions["photo_search"] = state
+    return state
+
+
+def match_expression(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted so FTS5 operators and column filters typed by the user
+    are searched for literally rather than interpreted.
+    """
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def ranked_matches(text: str):
+    """Subquery of (photo_id, rank) for photos matching `text`, or None if
+       the text has nothing searchable in it. Lower rank is a better match."""
+    expr = match_expression(text)
+    if not expr:
+        return None
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    return (
+        db.select(
+            _fts.c.rowid.label("photo_id"),
+            db.literal_column(f"bm25(photo_search, {weights})").label("rank"),
+        )
+        .where(db.text("photo_search MATCH :expr").bindparams(expr=expr))
+        .subquery()
+    )
+
+
+def reindex(connection, photo_ids) -> None:
+    """Rewrite the index rows for `photo_ids` from the current table state."""
+    ids = list(photo_ids)
+    if not ids:
+        return
+    params = {"ids": ids}
+    delete = db.text("DELETE FROM photo_search WHERE rowid IN :ids")
+    insert = db.text(INSERT_ROWS + " WHERE p.id IN :ids")
+    connection.execute(delete.bindparams(db.bindparam("ids", expanding=True)), params)
+    connection.execute(insert.bindparams(db.bindparam("ids", expanding=True)), params)
+
+
+def rebuild() -> int:
+    """Recreate the whole index; returns the number of photos indexed."""
+    db.session.execute(db.text("DELETE FROM photo_search"))
+    db.session.execute(db.text(INSERT_ROWS))
+    db.session.commit()
+    return db.session.query(db.func.count(Photo.id)).scalar()
+
+
+def _photo_ids(obj) -> set:
+    """Photo ids whose index rows a flushed Tag/Comment affects, including
+       the photo it was moved away from."""
+    return {pid for pid in inspect(obj).attrs.photo_id.history.sum() if pid}
+
+
+@event.listens_for(db.session, "after_flush")
+def _index_flushed_changes(session, flush_context):
+    if not enabled():
+        return
+    # deleted photos are already gone from the photo table, so reindexing
+    # them just drops their rows
+    changed = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Photo):
+            changed.add(obj.id)
+        elif isinstance(obj, (Tag, Comment)):
+            changed |= _photo_ids(obj)
+        elif isinstance(obj, Album) and inspect(obj).attrs.title.history.has_changes():
+            changed.update(
+                pid for (pid,) in session.connection().execute(
+                    db.select(Photo.id).where(Photo.album_id == obj.id)
+                )
+            )
+    reindex(session.connection(), changed)
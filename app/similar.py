@@ -0,0 +1,139 @@
+"""Near-duplicate detection: bursts, retakes and re-saved copies.
+
+Every image gets a 64-bit dHash when its renditions are built
+(media.dhash). Visually similar pictures differ in few bits, so finding
+them is a Hamming-distance search, done by multi-index hashing. The hash
+is split into four 16-bit bands, stored in indexed columns
+(photo.phash_b0..b3). If two hashes are within distance d, then by
+pigeonhole at least one band differs in no more than d // 4 bits. So
+probing every band for its value and the values within that radius finds
+every candidate through the indexes, and each candidate is then checked
+on the full hash. With 16-bit bands a 100k-photo library averages under
+two photos per band value, so a lookup reads a few dozen rows, not the
+library. The bands are probed as a UNION of one search per band index;
+SQLite's planner turns the equivalent OR into a scan of the owner's rows.
+
+group_near_duplicates() runs the same probe over a whole list at once
+with numpy, which does the candidate search and the Hamming checks,
+then joins the matches into groups with union-find.
+"""
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+
+from .models import db, Photo
+
+BANDS = 4
+BAND_BITS = 16
+MASK64 = (1 << 64) - 1
+BAND_COLUMNS = (Photo.phash_b0, Photo.phash_b1, Photo.phash_b2, Photo.phash_b3)
+
+
+def unsigned(phash: int) -> int:
+    return phash & MASK64
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & MASK64).bit_count()
+
+
+def bands(phash: int) -> tuple:
+    value = unsigned(phash)
+    return tuple((value >> (BAND_BITS * (BANDS - 1 - i))) & 0xFFFF for i in range(BANDS))
+
+
+def band_neighbours(value: int, radius: int) -> list:
+    """Every 16-bit value within `radius` bit flips of `value`, itself included."""
+    out = [value]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            out.append(flipped)
+    return out
+
+
+def probe_radius(max_distance: int) -> int:
+    return max_distance // BANDS
+
+
+def near_duplicates(photo: Photo, max_distance: int) -> list:
+    """The owner's other photos within max_distance of `photo`, as
+       (distance, photo) pairs, closest first."""
+    if photo.phash is None:
+        return []
+    radius = probe_radius(max_distance)
+    probes = db.union(*(
+        db.select(Photo.id).where(
+            Photo.user_id == photo.user_id,
+            column.in_(band_neighbours(value, radius))
+        )
+        for column, value in zip(BAND_COLUMNS, bands(photo.phash))
+    ))
+    candidates = Photo.query.filter(
+        Photo.id.in_(probes),
+        Photo.id != photo.id,
+        Photo.status == 'ready',
+    )
+    matches = [(hamming(photo.phash, c.phash), c) for c in candidates]
+    return sorted(
+        ((d, c) for d, c in matches if d <= max_distance),
+        key=lambda m: (m[0], m[1].id)
+    )
+
+
+def _band_matches(values: np.ndarray, shift: int, radius: int):
+    """Index pairs (i, j), i < j, whose band at `shift` is within `radius`
+       bits. Photos are bucketed by band value (a counting sort, since a
+       band has only 65536 values), so each probe is two table lookups."""
+    band = ((values >> np.uint64(shift)) & np.uint64(0xFFFF)).astype(np.int64)
+    order = np.argsort(band, kind="stable")
+    bucket_start = np.zeros((1 << BAND_BITS) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(band, minlength=1 << BAND_BITS), out=bucket_start[1:])
+    for flip in band_neighbours(0, radius):
+        probe = band ^ flip
+        lo = bucket_start[probe]
+        counts = bucket_start[probe + 1] - lo
+        total = int(counts.sum())
+        if not total:
+            continue
+        i = np.repeat(np.arange(len(values)), counts)
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        j = order[starts + np.arange(total)]
+        keep = i < j
+        yield i[keep], j[keep]
+
+
+def group_near_duplicates(photos: list, max_distance: int) -> list:
+    """Split photos into groups of two or more near-duplicates, joining
+       chains (a~b, b~c) into one group. Groups keep the input order and
+       come in the order of their first member; photos without a hash and
+       photos with no match are left out."""
+    hashed = [p for p in photos if p.phash is not None]
+    if len(hashed) < 2:
+        return []
+    values = np.array([unsigned(p.phash) for p in hashed], dtype=np.uint64)
+    radius = probe_radius(max_distance)
+
+    parent = list(range(len(hashed)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(BANDS):
+        shift = BAND_BITS * (BANDS - 1 - band)
+        for i, j in _band_matches(values, shift, radius):
+            close = np.bitwise_count(values[i] ^ values[j]) <= max_distance
+            for a, b in zip(i[close].tolist(), j[close].tolist()):
+                parent[find(a)] = find(b)
+
+    # dicts keep insertion order, so groups come out by their first member
+    groups = defaultdict(list)
+    for i, photo in enumerate(hashed):
+        groups[find(i)].append(photo)
+    return [g for g in groups.values() if len(g) > 1]
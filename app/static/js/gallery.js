@@ -3,6 +3,8 @@
 
 const preview      = document.getElementById('preview');
 const previewBox   = document.querySelector('#preview .preview-box');
+const STATUS_POLL_MS = 3000;
+let statusPollTimer = null;
 let mediaList = [];
 let currentIndex = 0;
 
@@ -10,7 +12,10 @@ function populateMediaList() {
   mediaList = Array.from(document.querySelectorAll('img.clickable[data-full]'))
     .map(el => ({
       src: el.dataset.full,
-      type: el.dataset.type || 'image'
+      original: el.dataset.original,
+      hls: el.dataset.hls,
+      type: el.dataset.type || 'image',
+      comments: el.closest('.media-card')?.querySelector('.card-panel')?.dataset.commentsUrl
     }));
 }
 
@@ -22,21 +27,70 @@ function openPreviewAt(index) {
 
 function showPreview() {
   previewBox.innerHTML = '';
-  const { src, type } = mediaList[currentIndex];
+  const { src, original, hls, type, comments } = mediaList[currentIndex];
   let content;
   if (type === 'video') {
     content = document.createElement('video');
-    content.src = src;
+    // only the headers up front; seeking then fetches byte ranges
+    content.preload = 'metadata';
+    // the browser takes the first source it can play and moves on when one
+    // is missing: HLS where supported natively (Safari, iOS), then the
+    // faststart MP4, then the original while the transcode is still queued
+    const sources = [[src, 'video/mp4'], [original, '']];
+    if (hls && content.canPlayType('application/vnd.apple.mpegurl')) {
+      sources.unshift([hls, 'application/vnd.apple.mpegurl']);
+    }
+    sources.filter(([url]) => url).forEach(([url, mime]) => {
+      const source = document.createElement('source');
+      source.src = url;
+      if (mime) source.type = mime;
+      content.appendChild(source);
+    });
     content.controls = true;
     content.autoplay = true;
     content.playsInline = true;
   } else {
     content = document.createElement('img');
+    // fall back to the original if the lightbox rendition isn't built yet
+    if (original) {
+      content.addEventListener('error', () => { content.src = original; }, { once: true });
+    }
     content.src = src;
     content.alt = '';
   }
   content.className = 'preview-content';
   previewBox.appendChild(content);
+  if (comments) showPreviewComments(comments);
+}
+
+// The lightbox shows the file's comments too, fetched as it's opened
+function showPreviewComments(url) {
+  const box = document.createElement('div');
+  box.className = 'preview-comments';
+  const list = document.createElement('div');
+  list.className = 'comments';
+  box.appendChild(list);
+  previewBox.appendChild(box);
+  fetch(url)
+    .then(response => {
+      if (!response.ok) throw new Error("Failed to load comments");
+      return response.json();
+    })
+    .then(data => {
+      list.appendChild(commentItem(`Uploaded by ${data.uploader}`));
+      appendComments(list, data.items);
+      if (data.next_url) {
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'btn btn-secondary comments-more';
+        more.dataset.url = data.next_url;
+        more.textContent = 'More comments';
+        // clicks inside the lightbox don't reach the document listener
+        more.addEventListener('click', () => loadMoreComments(more));
+        box.appendChild(more);
+      }
+    })
+    .catch(err => console.error("Lightbox comments error:", err));
 }
 
 function navigate(offset) {
@@ -49,7 +103,14 @@ function closePreview() {
 }
 
 function handleError(imgElement) {
-  const fallbackUrl = imgElement.dataset.full;
+  // images without a thumbnail yet: show the original before giving up
+  const original = imgElement.dataset.original;
+  const isVideo = imgElement.dataset.type === 'video';
+  if (original && !isVideo && imgElement.getAttribute('src') !== original) {
+    imgElement.src = original;
+    return;
+  }
+  const fallbackUrl = imgElement.dataset.original || imgElement.dataset.full;
   const filename = fallbackUrl.split('/').pop();
   const link = document.createElement('a');
   link.href = fallbackUrl;
@@ -58,6 +119,330 @@ function handleError(imgElement) {
   imgElement.parentNode.replaceChild(link, imgElement);
 }
 
+function commentItem(text) {
+  const item = document.createElement('p');
+  item.className = 'comment-item';
+  item.textContent = text;
+  return item;
+}
+
+function appendComments(list, items) {
+  items.forEach(c => list.appendChild(commentItem(`${c.author} — ${c.text}`)));
+}
+
+// Next page of a card's (or the lightbox's) comments, from the button's URL
+function loadMoreComments(button) {
+  const list = button.parentElement.querySelector('.comments');
+  button.disabled = true;
+  fetch(button.dataset.url)
+    .then(response => {
+      if (!response.ok) throw new Error("Failed to load comments");
+      return response.json();
+    })
+    .then(data => {
+      appendComments(list, data.items);
+      if (data.next_url) {
+        button.dataset.url = data.next_url;
+      } else {
+        button.remove();
+      }
+    })
+    .catch(err => console.error("Comments error:", err))
+    .finally(() => { button.disabled = false; });
+}
+
+// Open or close a card's panel: its comments and editing forms, fetched
+// the first time it's opened so the gallery page carries only the cards
+function togglePanel(button) {
+  const card = button.closest('.media-card');
+  const panel = card.querySelector('.card-panel');
+  const open = panel.hidden;
+  const show = () => {
+    panel.hidden = !open;
+    button.setAttribute('aria-expanded', String(open));
+    // the panel's forms replace the card's read-only description and tags
+    card.classList.toggle('editing', open && Boolean(panel.querySelector('.desc-form')));
+  };
+  if (!open || panel.dataset.loaded) {
+    show();
+    return;
+  }
+  button.disabled = true;
+  fetch(panel.dataset.panelUrl)
+    .then(response => {
+      if (!response.ok) throw new Error("Failed to load panel");
+      return response.json();
+    })
+    .then(data => {
+      panel.innerHTML = data.html;
+      panel.dataset.loaded = '1';
+      show();
+    })
+    .catch(err => console.error("Panel error:", err))
+    .finally(() => { button.disabled = false; });
+}
+
+// Swap a "Processing…" placeholder for the finished thumbnail
+function replacePlaceholder(placeholder, info) {
+  const card = placeholder.closest('.media-card');
+  const oldName = placeholder.dataset.filename;
+
+  const img = document.createElement('img');
+  img.src = info.thumb;
+  img.alt = info.filename;
+  img.className = 'clickable';
+  img.loading = 'lazy';
+  img.dataset.full = info.full;
+  img.dataset.type = info.type;
+  img.dataset.original = info.original;
+  if (info.hls) img.dataset.hls = info.hls;
+  if (info.preview) img.dataset.preview = info.preview;
+  img.addEventListener('error', () => handleError(img));
+
+  const wrapper = document.createElement('div');
+  wrapper.className = 'media-wrapper';
+  wrapper.appendChild(img);
+  if (info.type === 'video') {
+    const overlay = document.createElement('div');
+    overlay.className = 'play-overlay';
+    overlay.setAttribute('aria-hidden', 'true');
+    overlay.textContent = '►';
+    wrapper.appendChild(overlay);
+  }
+  placeholder.replaceWith(wrapper);
+
+  // HEIC uploads come back as .jpg, so point the card's forms at the new name
+  if (card && oldName && oldName !== info.filename) {
+    const attrs = ['action', 'href', 'value', 'id', 'data-form', 'data-filename', 'data-panel-url',
+                   'data-comments-url', 'data-url', 'aria-label', 'onsubmit'];
+    [card, ...card.querySelectorAll('*')].forEach(el => {
+      attrs.forEach(attr => {
+        const value = el.getAttribute(attr);
+        if (value && value.includes(oldName)) {
+          el.setAttribute(attr, value.split(oldName).join(info.filename));
+        }
+      });
+    });
+  }
+}
+
+// Play a video's animated keyframe preview while it's hovered. The preview
+// is loaded off-screen first, so a video without one (uploaded before
+// previews existed) just keeps its still thumbnail.
+function startHoverPreview(img) {
+  if (img.dataset.previewFailed) return;
+  const probe = new Image();
+  probe.onload = () => {
+    if (!img.matches(':hover') || img.dataset.still) return;
+    img.dataset.still = img.src;
+    img.src = img.dataset.preview;
+  };
+  probe.onerror = () => { img.dataset.previewFailed = '1'; };
+  probe.src = img.dataset.preview;
+}
+
+function stopHoverPreview(img) {
+  if (!img.dataset.still) return;
+  img.src = img.dataset.still;
+  delete img.dataset.still;
+}
+
+// Poll the processing status of any placeholders until they're all done
+function schedulePendingPoll() {
+  if (!statusPollTimer) statusPollTimer = setTimeout(pollPendingMedia, STATUS_POLL_MS);
+}
+
+function pollPendingMedia() {
+  statusPollTimer = null;
+  const pending = Array.from(document.querySelectorAll('.media-placeholder[data-status="pending"]'));
+  if (!pending.length) return;
+
+  const ids = pending.map(el => el.dataset.photoId).join(',');
+  fetch(`/media/status?ids=${ids}`)
+    .then(response => {
+      if (!response.ok) throw new Error("Status request failed");
+      return response.json();
+    })
+    .then(statuses => {
+      pending.forEach(el => {
+        const info = statuses[el.dataset.photoId];
+        if (!info || info.status === 'pending') return;
+        if (info.status === 'failed') {
+          el.dataset.status = 'failed';
+          el.textContent = '⚠️ Processing failed';
+        } else {
+          replacePlaceholder(el, info);
+        }
+      });
+    })
+    .catch(err => console.error("Media status error:", err))
+    .finally(schedulePendingPoll);
+}
+
+// Infinite scroll: fetch the next page of cards when the sentinel comes into view
+function setupInfiniteScroll() {
+  const grid = document.querySelector('.image-gallery-grid[data-page-url]');
+  const sentinel = document.getElementById('gallery-sentinel');
+  if (!grid || !sentinel || !grid.dataset.nextCursor) return;
+
+  let loading = false;
+  const observer = new IntersectionObserver(entries => {
+    if (loading || !entries.some(entry => entry.isIntersecting)) return;
+    const cursor = grid.dataset.nextCursor;
+    if (!cursor) {
+      observer.disconnect();
+      return;
+    }
+
+    loading = true;
+    const url = new URL(grid.dataset.pageUrl, window.location.origin);
+    url.searchParams.set('cursor', cursor);
+    fetch(url)
+      .then(response => {
+        if (!response.ok) throw new Error("Failed to load more media");
+        return response.json();
+      })
+      .then(data => {
+        grid.insertAdjacentHTML('beforeend', data.html);
+        grid.dataset.nextCursor = data.next_cursor || '';
+        if (!data.next_cursor) observer.disconnect();
+        schedulePendingPoll();
+      })
+      .catch(err => console.error("Infinite scroll error:", err))
+      .finally(() => { loading = false; });
+  }, { rootMargin: '600px 0px' });
+
+  observer.observe(sentinel);
+}
+
+// Multi-select: pick cards, then tag, move, describe or delete them all
+// with one POST /api/bulk. The selection is kept by filename, so it
+// survives the edited cards being swapped for freshly rendered ones.
+const selectedFiles = new Set();
+let lastSelectedCard = null;
+
+function selectableCards() {
+  return Array.from(document.querySelectorAll('.media-card[data-filename]'));
+}
+
+function cardFor(filename) {
+  return document.querySelector(`.media-card[data-filename="${CSS.escape(filename)}"]`);
+}
+
+function setCardSelected(card, selected) {
+  const filename = card.dataset.filename;
+  if (selected) selectedFiles.add(filename); else selectedFiles.delete(filename);
+  card.classList.toggle('selected', selected);
+  const box = card.querySelector('.select-box input');
+  if (box) box.checked = selected;
+}
+
+function updateBulkCount() {
+  const count = document.querySelector('#bulk-bar .bulk-count');
+  if (count) count.textContent = `${selectedFiles.size} selected`;
+}
+
+// Shift-click selects every card between the last one clicked and this one
+function toggleCardSelection(card, shiftKey) {
+  const selected = !selectedFiles.has(card.dataset.filename);
+  if (shiftKey && lastSelectedCard && lastSelectedCard.isConnected) {
+    const cards = selectableCards();
+    const [from, to] = [cards.indexOf(lastSelectedCard), cards.indexOf(card)].sort((a, b) => a - b);
+    cards.slice(from, to + 1).forEach(c => setCardSelected(c, selected));
+  } else {
+    setCardSelected(card, selected);
+  }
+  lastSelectedCard = card;
+  updateBulkCount();
+}
+
+function setSelectMode(on) {
+  document.body.classList.toggle('select-mode', on);
+  const bar = document.getElementById('bulk-bar');
+  if (bar) bar.hidden = !on;
+  if (!on) {
+    selectableCards().forEach(card => setCardSelected(card, false));
+    selectedFiles.clear();
+    lastSelectedCard = null;
+  }
+  updateBulkCount();
+}
+
+function sendBulk(ops) {
+  if (!selectedFiles.size) return Promise.resolve();
+  return fetch('/api/bulk', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filenames: Array.from(selectedFiles), ops })
+  })
+    .then(response => response.json().then(data => {
+      if (!response.ok) throw new Error(data.message || "Bulk edit failed");
+      return data;
+    }))
+    .then(data => {
+      data.deleted.concat(data.missing).forEach(filename => {
+        selectedFiles.delete(filename);
+        const card = cardFor(filename);
+        if (card) card.remove();
+      });
+      const fresh = document.createElement('template');
+      fresh.innerHTML = data.html;
+      fresh.content.querySelectorAll('.media-card[data-filename]').forEach(card => {
+        const old = cardFor(card.dataset.filename);
+        if (!old) return;
+        old.replaceWith(card);
+        setCardSelected(card, true);
+      });
+      updateBulkCount();
+      schedulePendingPoll();
+    })
+    .catch(err => {
+      console.error("Bulk edit error:", err);
+      alert(err.message);
+    });
+}
+
+function setupMultiSelect() {
+  const toggle = document.getElementById('select-toggle');
+  const bar = document.getElementById('bulk-bar');
+  if (!toggle || !bar) return;
+
+  toggle.addEventListener('click', () => {
+    setSelectMode(!document.body.classList.contains('select-mode'));
+  });
+
+  document.addEventListener('click', (e) => {
+    const box = e.target.closest('.select-box');
+    if (!box) return;
+    // the checkbox follows the selection, not the other way round
+    e.preventDefault();
+    toggleCardSelection(box.closest('.media-card'), e.shiftKey);
+  });
+
+  bar.querySelectorAll('form[data-bulk-op]').forEach(form => {
+    form.addEventListener('submit', (e) => {
+      e.preventDefault();
+      const op = { op: form.dataset.bulkOp };
+      new FormData(form).forEach((value, key) => { op[key] = value; });
+      sendBulk([op]).then(() => form.reset());
+    });
+  });
+
+  bar.addEventListener('click', (e) => {
+    const action = e.target.closest('[data-bulk]')?.dataset.bulk;
+    if (action === 'select-all') {
+      selectableCards().forEach(card => setCardSelected(card, true));
+      updateBulkCount();
+    } else if (action === 'delete') {
+      if (selectedFiles.size && confirm(`Delete ${selectedFiles.size} files?`)) {
+        sendBulk([{ op: 'delete' }]);
+      }
+    } else if (action === 'done') {
+      setSelectMode(false);
+    }
+  });
+}
+
 // ✅ FIXED: submitForm is now in global scope
 function submitForm(formId) {
   const form = document.getElementById(formId);
@@ -69,11 +454,34 @@ function submitForm(formId) {
 }
 
 document.addEventListener('DOMContentLoaded', () => {
-  populateMediaList();
-  document.querySelectorAll('img.clickable[data-full]').forEach((img, idx) => {
-    img.addEventListener('click', () => openPreviewAt(idx));
+  // delegated so thumbnails swapped in after processing open the lightbox too
+  document.addEventListener('click', (e) => {
+    const img = e.target.closest('img.clickable[data-full]');
+    if (!img) return;
+    // in select mode a click on one of your own thumbnails selects it
+    const selectable = img.closest('.media-card[data-filename]');
+    if (selectable && document.body.classList.contains('select-mode')) {
+      toggleCardSelection(selectable, e.shiftKey);
+      return;
+    }
+    const all = Array.from(document.querySelectorAll('img.clickable[data-full]'));
+    populateMediaList();
+    openPreviewAt(all.indexOf(img));
   });
 
+  document.addEventListener('mouseover', (e) => {
+    const img = e.target.closest('img[data-preview]');
+    if (img) startHoverPreview(img);
+  });
+  document.addEventListener('mouseout', (e) => {
+    const img = e.target.closest('img[data-preview]');
+    if (img) stopHoverPreview(img);
+  });
+
+  pollPendingMedia();
+  setupInfiniteScroll();
+  setupMultiSelect();
+
   // Add arrow button click listeners
   const prevBtn = document.getElementById('prevBtn');
   const nextBtn = document.getElementById('nextBtn');
@@ -133,6 +541,15 @@ document.addEventListener('DOMContentLoaded', () => {
   });
 });
 
+document.addEventListener('click', (e) => {
+  const toggle = e.target.closest('.panel-toggle');
+  if (toggle) {
+    togglePanel(toggle);
+  } else if (e.target.matches('.comments-more')) {
+    loadMoreComments(e.target);
+  }
+});
+
 document.addEventListener('click', function (e) {
   if (e.target.matches('.tag-delete-btn')) {
     e.preventDefault();
@@ -1,9 +1,135 @@
 'use strict';
 
+const uploadForm = document.getElementById('uploadForm');
+const uploadProgress = document.getElementById('uploadProgress');
+const uploadStatus = document.getElementById('uploadStatus');
+const MAX_CHUNK_RETRIES = 8;
+
 // If the user enters a new album name, override the select value
-document.getElementById('uploadForm').addEventListener('submit', function(e) {
+uploadForm.addEventListener('submit', function(e) {
   const newAlbum = document.getElementById('new_album').value.trim();
   if (newAlbum) {
     document.getElementById('album').value = newAlbum;
   }
+
+  // large files go through the resumable API so a dropped connection
+  // doesn't restart a multi-GB video from zero; small batches post as before
+  const files = Array.from(document.getElementById('photos').files);
+  const threshold = Number(uploadForm.dataset.resumableThreshold);
+  if (!window.fetch || !files.some(f => f.size > threshold)) return;
+
+  e.preventDefault();
+  uploadResumable(files).then(
+    () => { window.location = uploadForm.dataset.doneUrl; },
+    err => { setStatus(`Upload stopped: ${err.message}. Submit again to resume.`); }
+  ).finally(() => {
+    uploadForm.querySelector('button[type="submit"]').disabled = false;
+  });
 });
+
+function setStatus(text) {
+  uploadStatus.textContent = text;
+  uploadStatus.hidden = false;
+}
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// remembered per file so reloading the page and re-picking it resumes
+function resumeKey(file, ownerId) {
+  return `upload:${ownerId}:${file.name}:${file.size}:${file.lastModified}`;
+}
+
+async function chunkChecksum(blob) {
+  // crypto.subtle only exists on secure origins; chunks go unchecked elsewhere
+  if (!(window.crypto && crypto.subtle)) return null;
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return btoa(String.fromCharCode(...new Uint8Array(digest)));
+}
+
+async function uploadResumable(files) {
+  uploadForm.querySelector('button[type="submit"]').disabled = true;
+  const ownerId = uploadForm.elements.owner_id.value;
+  const album = document.getElementById('album').value;
+  const total = files.reduce((sum, f) => sum + f.size, 0);
+  let done = 0;
+  uploadProgress.max = total;
+  uploadProgress.hidden = false;
+
+  for (const [i, file] of files.entries()) {
+    setStatus(`Uploading ${file.name} (${i + 1} of ${files.length})…`);
+    await uploadFile(file, ownerId, album, sent => { uploadProgress.value = done + sent; });
+    done += file.size;
+  }
+}
+
+async function startUpload(file, ownerId, album) {
+  const key = resumeKey(file, ownerId);
+  const saved = localStorage.getItem(key);
+  if (saved) {
+    const res = await fetch(saved, { method: 'HEAD', credentials: 'same-origin' });
+    if (res.ok) return { url: saved, offset: Number(res.headers.get('Upload-Offset')) };
+    localStorage.removeItem(key);
+  }
+  const res = await fetch(uploadForm.dataset.resumableUrl, {
+    method: 'POST',
+    credentials: 'same-origin',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: file.name, size: file.size, owner_id: ownerId, album })
+  });
+  const body = await res.json();
+  if (!res.ok) throw new Error(body.error || `HTTP ${res.status}`);
+  localStorage.setItem(key, body.url);
+  return { url: body.url, offset: 0 };
+}
+
+async function uploadFile(file, ownerId, album, onProgress) {
+  const chunkSize = Number(uploadForm.dataset.chunkSize);
+  let { url, offset } = await startUpload(file, ownerId, album);
+  let failures = 0;
+
+  while (offset < file.size) {
+    onProgress(offset);
+    const chunk = file.slice(offset, offset + chunkSize);
+    const headers = {
+      'Content-Type': 'application/offset+octet-stream',
+      'Upload-Offset': String(offset)
+    };
+    const checksum = await chunkChecksum(chunk);
+    if (checksum) headers['Upload-Checksum'] = `sha256 ${checksum}`;
+
+    let res = null;
+    try {
+      res = await fetch(url, { method: 'PATCH', credentials: 'same-origin', headers, body: chunk });
+    } catch (err) {
+      // network dropped: fall through and ask the server where it got to
+    }
+    if (res && (res.ok || res.status === 409)) {
+      offset = Number(res.headers.get('Upload-Offset'));
+      failures = 0;
+      continue;
+    }
+    if (res && res.status < 500 && res.status !== 460) {
+      throw new Error(`server refused ${file.name} (HTTP ${res.status})`);
+    }
+    if (++failures > MAX_CHUNK_RETRIES) {
+      throw new Error(`too many failed attempts on ${file.name}`);
+    }
+    await sleep(Math.min(30000, 500 * 2 ** failures));
+    try {
+      const head = await fetch(url, { method: 'HEAD', credentials: 'same-origin' });
+      if (head.ok) offset = Number(head.headers.get('Upload-Offset'));
+    } catch (err) {
+      // still offline; retry the same chunk after the next backoff
+    }
+  }
+  onProgress(file.size);
+
+  const res = await fetch(`${url}/complete`, { method: 'POST', credentials: 'same-origin' });
+  if (!res.ok) {
+    const body = await res.json().catch(() => ({}));
+    throw new Error(body.error || `could not finish ${file.name}`);
+  }
+  localStorage.removeItem(resumeKey(file, ownerId));
+}
@@ -0,0 +1,84 @@
+"""The per-owner tag index: tag -> files, and how many files each tag has.
+
+Tag rows are the inverted index itself. ix_tag_owner_name_photo maps
+(owner, case-folded name) to photo ids without reading the rows, so a
+tag filter joins from the tag's matches to their photos and costs
+O(matches), and a global rename touches only the affected rows.
+
+tag_count holds each owner's distinct tags with their usage counts. The
+gallery's tag cloud reads it in O(distinct tags) rather than reading
+every tag row. An after_flush hook recounts exactly the (owner, name)
+keys a flush added, removed or renamed, in the same transaction. That
+covers add_tag, remove_tag, both renames, and tags deleted with their
+photo. Like the search index, it relies on the ORM. rebuild() recounts
+everything.
+"""
+from sqlalchemy import event, inspect
+
+from .models import db, Tag, TagCount
+
+# (owner_id, name_lower) pairs per statement, well under SQLite's bound-variable limit
+KEYS_PER_QUERY = 500
+# the longest tag any route accepts; SQLite wouldn't enforce the column's width
+MAX_TAG_LENGTH = Tag.name.type.length
+
+
+def _counted(*where):
+    """(owner_id, name_lower, name, count) per tag key matching `where`,
+       with the spelling of the key's most recently added tag."""
+    latest = db.select(
+        db.func.max(Tag.id).label("id"), db.func.count().label("count")
+    ).where(*where).group_by(Tag.owner_id, Tag.name_lower).subquery()
+    return db.select(Tag.owner_id, Tag.name_lower, Tag.name, latest.c.count).join(
+        latest, latest.c.id == Tag.id
+    )
+
+
+def refresh(connection, keys) -> None:
+    """Recount the given (owner_id, name_lower) keys from the tag table."""
+    keys = sorted(k for k in keys if None not in k)
+    table = TagCount.__table__
+    columns = ["owner_id", "name_lower", "name", "count"]
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        chunk = keys[start:start + KEYS_PER_QUERY]
+        connection.execute(table.delete().where(
+            db.tuple_(table.c.owner_id, table.c.name_lower).in_(chunk)
+        ))
+        connection.execute(table.insert().from_select(
+            columns, _counted(db.tuple_(Tag.owner_id, Tag.name_lower).in_(chunk))
+        ))
+
+
+def rebuild() -> int:
+    """Recount every tag; returns the number of distinct (owner, tag) keys."""
+    table = TagCount.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ["owner_id", "name_lower", "name", "count"], _counted()
+    ))
+    db.session.commit()
+    return db.session.query(db.func.count()).select_from(TagCount).scalar()
+
+
+def tag_cloud(owner_id: int) -> list:
+    """The owner's tags as TagCount rows, alphabetically."""
+    return TagCount.query.filter_by(owner_id=owner_id).order_by(TagCount.name_lower).all()
+
+
+def _flushed_keys(session) -> set:
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Tag):
+            state = inspect(obj)
+            # a rename counts against both the old name and the new one
+            owners = state.attrs.owner_id.history.sum()
+            names = state.attrs.name_lower.history.sum()
+            keys.update((owner_id, name) for owner_id in owners for name in names)
+    return keys
+
+
+@event.listens_for(db.session, "after_flush")
+def _recount_flushed_tags(session, flush_context):
+    keys = _flushed_keys(session)
+    if keys:
+        refresh(session.connection(), keys)
@@ -0,0 +1,84 @@
+"""Time near-duplicate lookups and album grouping on a synthetic library.
+
+    python benchmarks/near_duplicates.py [--photos N] [--distance D]
+
+Fills a throwaway SQLite database with N photos for one owner: random
+dHashes, plus one burst in twenty (three to six shots a few bits apart).
+Reports the median time of similar.near_duplicates() over 200 photos, and
+of similar.group_near_duplicates() over the whole library, which is the
+worst case for an album view. A linear scan is timed as the baseline.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=100_000)
+    parser.add_argument("--distance", type=int, default=6)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    from app import create_app, db
+    from app.models import User, Photo
+    from app import similar
+
+    app = create_app()
+    rng = random.Random(17)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="bench", email="bench@example.com", password_hash="x"))
+        db.session.commit()
+
+        hashes = []
+        while len(hashes) < args.photos:
+            base = rng.getrandbits(64)
+            hashes.append(base)
+            if rng.random() < 0.05:
+                for _ in range(rng.randint(2, 5)):
+                    shot = base
+                    for bit in rng.sample(range(64), rng.randint(1, args.distance)):
+                        shot ^= 1 << bit
+                    hashes.append(shot)
+        hashes = hashes[:args.photos]
+
+        started = time.perf_counter()
+        for i, h in enumerate(hashes):
+            photo = Photo(filename=f"{i:08d}.jpg", user_id=1, uploader_alias="bench")
+            photo.phash = h
+            db.session.add(photo)
+        db.session.commit()
+        print(f"inserted {len(hashes)} photos in {time.perf_counter() - started:.1f}s")
+
+        sample = Photo.query.order_by(db.func.random()).limit(200).all()
+        lookups = []
+        for photo in sample:
+            started = time.perf_counter()
+            similar.near_duplicates(photo, args.distance)
+            lookups.append(time.perf_counter() - started)
+        print(f"near_duplicates     median {statistics.median(lookups) * 1000:7.2f} ms"
+              f"   max {max(lookups) * 1000:7.2f} ms")
+
+        photos = Photo.query.order_by(Photo.id).all()
+        probe = sample[0]
+        started = time.perf_counter()
+        [p for p in photos if similar.hamming(p.phash, probe.phash) <= args.distance]
+        print(f"linear scan         {(time.perf_counter() - started) * 1000:7.2f} ms (one lookup)")
+
+        started = time.perf_counter()
+        groups = similar.group_near_duplicates(photos, args.distance)
+        print(f"group_near_duplicates {time.perf_counter() - started:.2f}s over {len(photos)} photos,"
+              f" {len(groups)} groups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Count the SQL statements each common page runs.
+
+    python benchmarks/query_counts.py [--owners N] [--photos N]
+
+Builds a throwaway SQLite library in which one viewer has been given
+access to N other galleries. It then requests the main pages as that
+viewer and prints how many statements each request ran. The page cache
+is off, so every request does its real work. The counter is a plain
+engine event, so this script runs unchanged on older trees for a
+before/after comparison.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owners", type=int, default=10)
+    parser.add_argument("--photos", type=int, default=60)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["PAGE_CACHE_ENABLED"] = "false"
+    os.environ["MEDIA_WORKER_MODE"] = "external"
+    from sqlalchemy import event
+    from app import create_app, db, media
+    from app.models import User, SharedAccess, Photo, Album
+
+    media.UPLOAD_BASE = Path(tmp) / "uploads"
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        viewer = User(username="viewer", email="viewer@example.com", password_hash="x", is_verified=True)
+        owners = [User(username=f"owner{i}", email=f"o{i}@example.com", password_hash="x", is_verified=True)
+                  for i in range(args.owners)]
+        db.session.add_all([viewer, *owners])
+        db.session.flush()
+        db.session.add_all(SharedAccess(owner_id=o.id, shared_user_id=viewer.id, alias=f"guest{o.id}")
+                           for o in owners)
+        album = Album(owner_id=viewer.id, title="Trip")
+        db.session.add(album)
+        db.session.add_all(Photo(filename=f"{i:04d}.jpg", user_id=viewer.id, uploader_alias="viewer",
+                                 album=album if i % 2 else None) for i in range(args.photos))
+        db.session.add(Photo(filename="shared.jpg", user_id=owners[0].id, uploader_alias="owner0"))
+        db.session.commit()
+        viewer_id, owner_id = viewer.id, owners[0].id
+        engine = db.engine
+
+    counts = []
+    event.listen(engine, "before_cursor_execute", lambda *a: counts.append(1))
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(viewer_id)
+        s["_fresh"] = True
+
+    def jpeg():
+        from PIL import Image
+        b = io.BytesIO()
+        # a new image each time, so upload dedup doesn't short-cut the request
+        Image.new("RGB", (64, 48), tuple(os.urandom(3))).save(b, "JPEG")
+        b.seek(0)
+        return b, "x.jpg"
+
+    requests = [
+        ("GET /", lambda: client.get("/")),
+        ("GET /api/gallery", lambda: client.get("/api/gallery")),
+        ("GET /feed", lambda: client.get("/feed")),
+        ("GET /api/feed", lambda: client.get("/api/feed")),
+        ("GET /albums", lambda: client.get("/albums")),
+        ("GET /album/Trip", lambda: client.get("/album/Trip")),
+        ("GET /upload", lambda: client.get("/upload")),
+        ("POST /upload (shared)", lambda: client.post(
+            "/upload", data={"owner_id": str(owner_id), "photos": [jpeg()]},
+            content_type="multipart/form-data")),
+        ("POST /add_comment (shared)", lambda: client.post(
+            "/add_comment/shared.jpg", data={"comment": "hi", "owner_id": str(owner_id)})),
+    ]
+    for name, send in requests:
+        send()  # warm up (first-request setup, lazy imports)
+        counts.clear()
+        response = send()
+        print(f"{name:<28}{response.status_code:>5}{len(counts):>6} queries")
+
+
+if __name__ == "__main__":
+    main()
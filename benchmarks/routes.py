@@ -0,0 +1,247 @@
+"""Time the main routes against synthetic libraries of increasing size.
+
+    python benchmarks/routes.py [--sizes 1000,10000,100000] [--runs 20]
+                                [--page-cache] [--save FILE] [--compare FILE]
+
+For each size, a fresh process builds an upload folder of that many
+files plus matching legacy descriptions.json, albums.json, tags.json and
+comments.json. It creates an empty SQLite database (with the full-text
+index) and loads the library through import-json, the path a real
+upgrade takes. Then it
+drives the test client against the main routes. Each route reports:
+
+  p50/p95/p99   latency in ms over --runs requests, after one warm-up
+  peak KB       the most Python memory one request had allocated
+                (tracemalloc, measured on a separate request)
+  sql           statements per request
+  file ops      file opens, directory listings, creates, renames and
+                deletes per request (audit events)
+
+The page cache is off unless --page-cache is given, so every request does
+its real work. --save writes the results as JSON. --compare reads such a
+file and exits 1 if any route's p95 grew by more than --tolerance (25% by
+default) or it runs more statements or file operations than before.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FILE_EVENTS = {"open", "os.listdir", "os.scandir", "os.mkdir", "os.remove",
+               "os.rename", "os.replace", "os.unlink", "shutil.rmtree"}
+WORDS = ("beach", "sunset", "birthday", "hike", "snow", "city", "garden", "dog",
+         "cat", "family", "road", "lake", "party", "museum", "market", "night")
+
+
+def make_fixtures(data_dir: Path, upload_dir: Path, user_id: int, n: int, seed: int = 0) -> dict:
+    """Write n empty media files (mtimes a minute apart, so upload times
+       are spread out) and the legacy JSON sidecars describing them."""
+    rng = random.Random(seed)
+    folder = upload_dir / str(user_id)
+    folder.mkdir(parents=True)
+    tag_names = [f"{w}{i}" for i in range(n // 400 + 1) for w in WORDS]
+    album_titles = [f"{rng.choice(WORDS).title()} {i}" for i in range(max(n // 50, 1))]
+    descriptions, albums, tags, comments = {}, {}, {}, {}
+    start = time.time() - n * 60
+    for i in range(n):
+        fn = f"{i:07d}.{'mp4' if i % 20 == 0 else 'jpg'}"
+        path = folder / fn
+        path.touch()
+        os.utime(path, (start + i * 60, start + i * 60))
+        if rng.random() < 0.3:
+            descriptions[fn] = " ".join(rng.choices(WORDS, k=6))
+        if rng.random() < 0.7:
+            albums[fn] = rng.choice(album_titles)
+        tags[fn] = rng.sample(tag_names, rng.randint(0, 3))
+        comments[fn] = ["Uploaded by owner"] + [
+            f"guest{rng.randint(1, 9)} — {' '.join(rng.choices(WORDS, k=4))}"
+            for _ in range(rng.randint(0, 2))
+        ]
+    albums["favorites"] = {str(user_id): rng.sample(album_titles, min(5, len(album_titles)))}
+    for name, data in (("descriptions", descriptions), ("albums", albums),
+                       ("tags", tags), ("comments", comments)):
+        (data_dir / f"{name}.json").write_text(json.dumps(data))
+    # the biggest album and most used tag, the slowest cases to view or rename
+    return {
+        "album": Counter(t for fn, t in albums.items() if fn != "favorites").most_common(1)[0][0],
+        "tag": Counter(name for names in tags.values() for name in names).most_common(1)[0][0],
+    }
+
+
+def jpeg():
+    from PIL import Image
+    b = io.BytesIO()
+    # a new image each time, so upload dedup doesn't short-cut the request
+    Image.new("RGB", (64, 48), tuple(os.urandom(3))).save(b, "JPEG")
+    b.seek(0)
+    return b, "upload.jpg"
+
+
+def _run_size(n: int, runs: int, page_cache: bool, queue) -> None:
+    tmp = Path(tempfile.mkdtemp())
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["PAGE_CACHE_ENABLED"] = "true" if page_cache else "false"
+    os.environ["MEDIA_WORKER_MODE"] = "external"
+    os.environ["METRICS_ENABLED"] = "false"
+    from sqlalchemy import event
+    from app import create_app, db, media
+    from app.importer import import_legacy_metadata
+    from app.models import User, Photo
+
+    media.UPLOAD_BASE = tmp / "uploads"
+    app = create_app()
+    app.config["TESTING"] = True
+    started = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        user = User(username="owner", email="owner@example.com", password_hash="x", is_verified=True)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        (tmp / "data").mkdir()
+        fixture = make_fixtures(tmp / "data", media.UPLOAD_BASE, user_id, n)
+        import_legacy_metadata(tmp / "data", media.UPLOAD_BASE)
+        middle = Photo.query.filter_by(user_id=user_id).order_by(
+            Photo.upload_time.desc(), Photo.id.desc()
+        ).offset(n // 2).first()
+        engine = db.engine
+    setup_seconds = time.perf_counter() - started
+
+    from app.routes import encode_cursor
+    deep_cursor = encode_cursor(middle.upload_time.isoformat(), middle.id)
+
+    queries, file_ops = [], []
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.append(1))
+    sys.addaudithook(lambda name, args: file_ops.append(1) if name in FILE_EVENTS else None)
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["_user_id"] = str(user_id)
+        s["_fresh"] = True
+
+    renamed = [False]
+
+    def rename_tag():
+        old, new = (fixture["tag"], "renamed") if not renamed[0] else ("renamed", fixture["tag"])
+        renamed[0] = not renamed[0]
+        return client.post("/rename_tag_global", data={"old_tag": old, "new_tag": new})
+
+    routes = [
+        ("GET /", lambda: client.get("/")),
+        ("GET /?search", lambda: client.get("/", query_string={"search": "sunset beach"})),
+        ("GET /?tag", lambda: client.get("/", query_string={"tag": fixture["tag"]})),
+        ("GET /api/gallery (deep)", lambda: client.get("/api/gallery", query_string={"cursor": deep_cursor})),
+        ("GET /feed", lambda: client.get("/feed")),
+        ("GET /albums", lambda: client.get("/albums")),
+        ("GET /album/<largest>", lambda: client.get(f"/album/{fixture['album']}")),
+        ("POST /upload", lambda: client.post(
+            "/upload", data={"owner_id": str(user_id), "photos": [jpeg()]},
+            content_type="multipart/form-data")),
+        ("POST /rename_tag_global", rename_tag),
+    ]
+    results = {}
+    for name, send in routes:
+        status = send().status_code  # warm up (first-request setup, lazy imports)
+        times, sql, ops = [], [], []
+        for _ in range(runs):
+            queries.clear()
+            file_ops.clear()
+            t0 = time.perf_counter()
+            send()
+            times.append((time.perf_counter() - t0) * 1000)
+            sql.append(len(queries))
+            ops.append(len(file_ops))
+        tracemalloc.start()
+        send()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        cuts = statistics.quantiles(times, n=100) if len(times) > 1 else times * 99
+        results[name] = {
+            "status": status,
+            "p50": statistics.median(times), "p95": cuts[94], "p99": cuts[98],
+            "peak_kb": peak / 1024,
+            "sql": statistics.median(sql),
+            "file_ops": statistics.median(ops),
+        }
+    queue.put({
+        "setup_seconds": setup_seconds,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "routes": results,
+    })
+
+
+def run_size(n: int, runs: int, page_cache: bool) -> dict:
+    # a fresh process per size: config is read at import, and peak RSS
+    # would otherwise carry over from the previous library
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_size, args=(n, runs, page_cache, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for size, current in results.items():
+        before = baseline.get(size)
+        if before is None:
+            continue
+        for route, now in current["routes"].items():
+            was = before["routes"].get(route)
+            if was is None:
+                continue
+            if now["p95"] > was["p95"] * (1 + tolerance):
+                found.append(f"{size} {route}: p95 {was['p95']:.1f} -> {now['p95']:.1f} ms")
+            for key in ("sql", "file_ops"):
+                if now[key] > was[key]:
+                    found.append(f"{size} {route}: {key} {was[key]:g} -> {now[key]:g}")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000",
+                        type=lambda s: [int(n) for n in s.split(",")])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--page-cache", action="store_true")
+    parser.add_argument("--save", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {}
+    for n in args.sizes:
+        result = results[str(n)] = run_size(n, args.runs, args.page_cache)
+        print(f"\n{n} files: built and imported in {result['setup_seconds']:.1f} s, "
+              f"peak RSS {result['max_rss_mb']:.0f} MB")
+        print(f"{'route':<28}{'status':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'peak KB':>10}{'sql':>6}{'file ops':>10}")
+        for route, r in result["routes"].items():
+            print(f"{route:<28}{r['status']:>7}{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}"
+                  f"{r['peak_kb']:>10.0f}{r['sql']:>6g}{r['file_ops']:>10g}")
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.compare:
+        found = regressions(results, json.loads(args.compare.read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
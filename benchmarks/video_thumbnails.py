@@ -0,0 +1,92 @@
+"""Compare the PyAV keyframe thumbnailer with the old MoviePy path.
+
+    python benchmarks/video_thumbnails.py [VIDEO ...] [--runs N]
+
+With no videos given, synthetic 1080p and 4K H.264 clips are generated
+(with PyAV) in a temp folder. Prints the median wall time and peak RSS
+growth of each extractor per file; each run happens in a fresh process so
+one extractor's memory can't flatter the other.
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_clip(path: Path, width: int, height: int, seconds: int = 20, fps: int = 30) -> Path:
+    import av
+    import numpy as np
+
+    with av.open(str(path), "w") as out:
+        stream = out.add_stream("h264", rate=fps)
+        stream.width, stream.height, stream.pix_fmt = width, height, "yuv420p"
+        stream.options = {"g": str(fps * 2), "preset": "ultrafast"}
+        for i in range(seconds * fps):
+            frame = np.zeros((height, width, 3), np.uint8)
+            frame[:, : (i * 7) % width] = (i % 255, 80, 160)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format="rgb24")):
+                out.mux(packet)
+        for packet in stream.encode():
+            out.mux(packet)
+    return path
+
+
+def _run(extractor: str, video: str, out_dir: str, queue) -> None:
+    from app import media
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if extractor == "pyav":
+        media.video_keyframe_renditions(Path(video), Path(out_dir) / "pyav.jpg")
+    elif extractor == "pyav+preview":
+        media.video_keyframe_renditions(Path(video), Path(out_dir) / "pyav.jpg",
+                                        Path(out_dir) / "preview.webp")
+    else:
+        media.moviepy_video_thumbnail(Path(video), Path(out_dir) / "moviepy.jpg")
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # moviepy's ffmpeg reader is a subprocess; count its memory too
+    child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put((elapsed, max(peak - before, child)))
+
+
+def measure(extractor: str, video: Path, out_dir: str, runs: int) -> tuple:
+    ctx = multiprocessing.get_context("spawn")
+    times, memory = [], []
+    for _ in range(runs):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(extractor, str(video), out_dir, queue))
+        proc.start()
+        elapsed, rss_kb = queue.get()
+        proc.join()
+        times.append(elapsed)
+        memory.append(rss_kb)
+    return statistics.median(times), max(memory) / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("videos", nargs="*", type=Path)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        videos = args.videos or [
+            make_clip(Path(tmp) / "1080p.mp4", 1920, 1080),
+            make_clip(Path(tmp) / "2160p.mp4", 3840, 2160),
+        ]
+        print(f"{'file':<24}{'extractor':<16}{'median s':>10}{'peak MB':>10}")
+        for video in videos:
+            for extractor in ("moviepy", "pyav", "pyav+preview"):
+                seconds, mb = measure(extractor, video, tmp, args.runs)
+                print(f"{video.name:<24}{extractor:<16}{seconds:>10.3f}{mb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
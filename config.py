@@ -15,11 +15,68 @@ class Config:
         f"sqlite:///{os.path.join(basedir, 'app.db')}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # how long a worker waits for SQLite's write lock (see app/database.py)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_WAL_SIZE_LIMIT = int(os.getenv("SQLITE_WAL_SIZE_LIMIT", 64 * 1024 * 1024))
+    DB_CHECKPOINT_SECONDS = int(os.getenv("DB_CHECKPOINT_SECONDS", 300))
 
     # Uploads
     UPLOAD_FOLDER = os.path.join(basedir, "app", "static", "uploads")
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024 * 1024  # 10 GB
 
+    # Media delivery (see app/delivery.py): "", "x-accel-redirect" or "x-sendfile"
+    MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "")
+    MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/_protected/")
+    MEDIA_ROOT = os.getenv("MEDIA_ROOT", basedir)  # what the nginx location aliases
+    MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", 365 * 24 * 3600))
+
+    # Resumable uploads (see app/resumable.py): files above the threshold are
+    # sent in chunks by upload.js; abandoned uploads are purged after the TTL
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+    RESUMABLE_UPLOAD_THRESHOLD = int(os.getenv("RESUMABLE_UPLOAD_THRESHOLD", 64 * 1024 * 1024))
+    UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 72))
+
+    # Gallery pagination (items per infinite-scroll page)
+    GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE", 40))
+    GALLERY_MAX_PAGE_SIZE = 200
+    # Comments per page of a card's lazily loaded panel (GET /api/photo/.../comments)
+    COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", 20))
+    # Files one multi-select edit (POST /api/bulk) may touch
+    BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", 1000))
+
+    # Near-duplicate grouping (see app/similar.py): the most dHash bits two
+    # photos may differ in; up to 7 keeps each index probe to 17 values
+    NEAR_DUPLICATE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_DISTANCE", 6))
+
+    # Rendered-page cache (see app/cache.py): "" for in-process, or sqlite:///<path>
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+    PAGE_CACHE_URL = os.getenv("PAGE_CACHE_URL", "")
+    PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 256))
+
+    # Shared-gallery grants (see app/permissions.py); 0 disables the process cache
+    PERMISSION_CACHE_SECONDS = int(os.getenv("PERMISSION_CACHE_SECONDS", 60))
+    # Add an X-Query-Count header and a debug log line with each request's SQL count
+    SQL_QUERY_COUNT = os.getenv("SQL_QUERY_COUNT", "false").lower() in ("true", "1", "yes")
+
+    # Metrics at /metrics (see app/metrics.py), served only with
+    # "Authorization: Bearer <token>"; /metrics is a 404 while the token is unset
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("true", "1", "yes")
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+    # ?_profile=1 returns a sampled profile of the request instead; development only
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("true", "1", "yes")
+    PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+
+    # Media processing queue (see app/jobs.py): embedded, external or inline
+    MEDIA_WORKER_MODE = os.getenv("MEDIA_WORKER_MODE", "embedded")
+    MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 2))
+    MEDIA_JOB_POLL_SECONDS = float(os.getenv("MEDIA_JOB_POLL_SECONDS", 1.0))
+    MEDIA_JOB_TIMEOUT_SECONDS = int(os.getenv("MEDIA_JOB_TIMEOUT_SECONDS", 3600))
+
+    # Streaming copies of videos (see app/media.py): a faststart MP4, plus an
+    # HLS rendition per listed height, e.g. "1080,720,360" ("" for no HLS)
+    VIDEO_TRANSCODE = os.getenv("VIDEO_TRANSCODE", "true").lower() in ("true", "1", "yes")
+    VIDEO_HLS_HEIGHTS = [int(h) for h in os.getenv("VIDEO_HLS_HEIGHTS", "").split(",") if h.strip()]
+
     # Email (Gmail SMTP via OAuth2)
     MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.gmail.com")
     MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
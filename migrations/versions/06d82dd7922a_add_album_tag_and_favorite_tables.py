@@ -0,0 +1,90 @@
+"""Add album, tag and favorite tables; move descriptions onto photo
+
+Revision ID: 06d82dd7922a
+Revises: c2db8294095d
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '06d82dd7922a'
+down_revision = 'c2db8294095d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'album',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=120), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('owner_id', 'title', name='uq_album_owner_title')
+    )
+    op.create_index('ix_album_owner_id', 'album', ['owner_id'], unique=False)
+
+    op.create_table(
+        'favorite_album',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('album_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['album_id'], ['album.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'album_id')
+    )
+    op.create_index('ix_favorite_album_album_id', 'favorite_album', ['album_id'], unique=False)
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('album_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('media_type', sa.String(length=10), nullable=False, server_default='image'))
+        batch_op.add_column(sa.Column('description', sa.Text(), nullable=False, server_default=''))
+        batch_op.create_foreign_key('fk_photo_album', 'album', ['album_id'], ['id'])
+        batch_op.create_index('ix_photo_album_id', ['album_id'], unique=False)
+        batch_op.create_index('ix_photo_user_id', ['user_id'], unique=False)
+        batch_op.create_unique_constraint('uq_photo_filename', ['filename'])
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_photo_id', ['photo_id'], unique=False)
+
+    op.create_table(
+        'tag',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('photo_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('name_lower', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['photo_id'], ['photo.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('photo_id', 'name_lower', name='uq_tag_photo_name')
+    )
+    op.create_index('ix_tag_photo_id', 'tag', ['photo_id'], unique=False)
+    op.create_index('ix_tag_owner_name', 'tag', ['owner_id', 'name_lower'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tag_owner_name', table_name='tag')
+    op.drop_index('ix_tag_photo_id', table_name='tag')
+    op.drop_table('tag')
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_photo_id')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_photo_filename', type_='unique')
+        batch_op.drop_index('ix_photo_user_id')
+        batch_op.drop_index('ix_photo_album_id')
+        batch_op.drop_constraint('fk_photo_album', type_='foreignkey')
+        batch_op.drop_column('description')
+        batch_op.drop_column('media_type')
+        batch_op.drop_column('album_id')
+
+    op.drop_index('ix_favorite_album_album_id', table_name='favorite_album')
+    op.drop_table('favorite_album')
+    op.drop_index('ix_album_owner_id', table_name='album')
+    op.drop_table('album')
@@ -0,0 +1,46 @@
+"""Add media_job queue and photo processing status
+
+Revision ID: 4b1f9e2c7a10
+Revises: 06d82dd7922a
+Create Date: 2026-10-18 11:40:03.552917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b1f9e2c7a10'
+down_revision = '06d82dd7922a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=10), nullable=False, server_default='ready'))
+
+    op.create_table(
+        'media_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('photo_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['photo_id'], ['photo.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_media_job_photo_id', 'media_job', ['photo_id'], unique=False)
+    op.create_index('ix_media_job_status', 'media_job', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_media_job_status', table_name='media_job')
+    op.drop_index('ix_media_job_photo_id', table_name='media_job')
+    op.drop_table('media_job')
+
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_column('status')
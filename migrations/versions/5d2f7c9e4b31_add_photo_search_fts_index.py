@@ -0,0 +1,39 @@
+"""Add photo_search FTS5 index over descriptions, tags, albums and comments
+
+Revision ID: 5d2f7c9e4b31
+Revises: e3b8a61d0c57
+Create Date: 2026-10-18 14:22:09.731846
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f7c9e4b31'
+down_revision = 'e3b8a61d0c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 is SQLite-only; elsewhere the gallery keeps its substring search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS photo_search USING fts5("
+        "filename, description, album, tags, comments, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "INSERT INTO photo_search (rowid, filename, description, album, tags, comments) "
+        "SELECT p.id, p.filename, p.description, COALESCE(a.title, ''), "
+        "COALESCE((SELECT group_concat(t.name, ' ') FROM tag t WHERE t.photo_id = p.id), ''), "
+        "COALESCE((SELECT group_concat(c.text, ' ') FROM comment c WHERE c.photo_id = p.id), '') "
+        "FROM photo p LEFT JOIN album a ON a.id = p.album_id"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TABLE IF EXISTS photo_search")
@@ -0,0 +1,26 @@
+"""Add user.cache_version for the rendered-page cache
+
+Revision ID: 7f1a3c5b9d82
+Revises: b6e4d2a8f913
+Create Date: 2026-10-18 16:11:35.640918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f1a3c5b9d82'
+down_revision = 'b6e4d2a8f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('cache_version')
@@ -0,0 +1,25 @@
+"""Add (user_id, upload_time, id) index for gallery pagination
+
+Revision ID: 9a7c3d5e1f24
+Revises: 4b1f9e2c7a10
+Create Date: 2026-10-18 13:05:27.104381
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9a7c3d5e1f24'
+down_revision = '4b1f9e2c7a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.create_index('ix_photo_user_upload', ['user_id', 'upload_time', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_user_upload')
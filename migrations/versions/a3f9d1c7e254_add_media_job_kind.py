@@ -0,0 +1,28 @@
+"""Add kind to media_job for video transcode jobs
+
+Revision ID: a3f9d1c7e254
+Revises: c8d5e2f4a617
+Create Date: 2026-10-18 18:40:12.518734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f9d1c7e254'
+down_revision = 'c8d5e2f4a617'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('media_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=10), nullable=False, server_default='process'))
+        batch_op.create_index('ix_media_job_kind_status', ['kind', 'status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('media_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_media_job_kind_status')
+        batch_op.drop_column('kind')
@@ -0,0 +1,42 @@
+"""Add upload_session table for resumable uploads
+
+Revision ID: b6e4d2a8f913
+Revises: 5d2f7c9e4b31
+Create Date: 2026-10-18 15:03:48.216570
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e4d2a8f913'
+down_revision = '5d2f7c9e4b31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_session',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('uploader_id', sa.Integer(), nullable=False),
+        sa.Column('uploader_alias', sa.String(length=80), nullable=False),
+        sa.Column('original_name', sa.String(length=255), nullable=False),
+        sa.Column('album_title', sa.String(length=120), nullable=True),
+        sa.Column('length', sa.BigInteger(), nullable=False),
+        sa.Column('offset', sa.BigInteger(), nullable=False),
+        sa.Column('checksum', sa.String(length=64), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['uploader_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_upload_session_uploader_id', 'upload_session', ['uploader_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_upload_session_uploader_id', table_name='upload_session')
+    op.drop_table('upload_session')
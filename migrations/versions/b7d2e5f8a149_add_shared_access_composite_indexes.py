@@ -0,0 +1,25 @@
+"""Add composite indexes to shared_access
+
+Revision ID: b7d2e5f8a149
+Revises: f1e8a4b2c937
+Create Date: 2026-10-18 20:48:09.115603
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e5f8a149'
+down_revision = 'f1e8a4b2c937'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shared_access_owner_user', 'shared_access', ['owner_id', 'shared_user_id'], unique=False)
+    op.create_index('ix_shared_access_user_owner', 'shared_access', ['shared_user_id', 'owner_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shared_access_user_owner', table_name='shared_access')
+    op.drop_index('ix_shared_access_owner_user', table_name='shared_access')
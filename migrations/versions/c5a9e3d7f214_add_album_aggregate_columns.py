@@ -0,0 +1,66 @@
+"""Add precomputed counts and covers to album
+
+Revision ID: c5a9e3d7f214
+Revises: b7d2e5f8a149
+Create Date: 2026-10-18 21:32:47.520913
+
+"""
+import json
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a9e3d7f214'
+down_revision = 'b7d2e5f8a149'
+branch_labels = None
+depends_on = None
+
+COVER_COUNT = 5
+
+
+def upgrade():
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('photo_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('video_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('cover_filenames', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.create_index('ix_photo_album_upload', ['album_id', 'upload_time', 'id'], unique=False)
+
+    # backfill: one pass over the photos in albums, newest first
+    conn = op.get_bind()
+    aggregates = {
+        album_id: {"photo_count": 0, "video_count": 0, "covers": []}
+        for (album_id,) in conn.execute(sa.text("SELECT id FROM album"))
+    }
+    for album_id, filename, media_type in conn.execute(sa.text(
+        "SELECT album_id, filename, media_type FROM photo WHERE album_id IS NOT NULL "
+        "ORDER BY album_id, upload_time DESC, id DESC"
+    )):
+        agg = aggregates.get(album_id)
+        if agg is None:
+            continue
+        agg["video_count" if media_type == "video" else "photo_count"] += 1
+        if len(agg["covers"]) < COVER_COUNT:
+            agg["covers"].append(filename)
+    now = datetime.utcnow()
+    for album_id, agg in aggregates.items():
+        conn.execute(
+            sa.text("UPDATE album SET photo_count = :photos, video_count = :videos, "
+                    "cover_filenames = :covers, updated_at = :now WHERE id = :id"),
+            {"photos": agg["photo_count"], "videos": agg["video_count"],
+             "covers": json.dumps(agg["covers"]), "now": now, "id": album_id},
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_index('ix_photo_album_upload')
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('cover_filenames')
+        batch_op.drop_column('video_count')
+        batch_op.drop_column('photo_count')
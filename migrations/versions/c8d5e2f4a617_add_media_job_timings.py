@@ -0,0 +1,26 @@
+"""Add per-stage timings to media_job
+
+Revision ID: c8d5e2f4a617
+Revises: 7f1a3c5b9d82
+Create Date: 2026-10-18 17:02:51.993204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d5e2f4a617'
+down_revision = '7f1a3c5b9d82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('media_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timings', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('media_job', schema=None) as batch_op:
+        batch_op.drop_column('timings')
@@ -0,0 +1,28 @@
+"""Add content_hash to photo for per-owner upload dedup
+
+Revision ID: d4c7b1e9f362
+Revises: a3f9d1c7e254
+Create Date: 2026-10-18 19:21:47.301186
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4c7b1e9f362'
+down_revision = 'a3f9d1c7e254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_photo_owner_hash', ['user_id', 'content_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_photo_owner_hash', type_='unique')
+        batch_op.drop_column('content_hash')
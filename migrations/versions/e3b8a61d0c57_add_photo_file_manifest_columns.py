@@ -0,0 +1,32 @@
+"""Add file manifest columns (size, mtime, dimensions) to photo
+
+Revision ID: e3b8a61d0c57
+Revises: 9a7c3d5e1f24
+Create Date: 2026-10-18 13:40:22.507131
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b8a61d0c57'
+down_revision = '9a7c3d5e1f24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_size', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('file_mtime', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('file_mtime')
+        batch_op.drop_column('file_size')
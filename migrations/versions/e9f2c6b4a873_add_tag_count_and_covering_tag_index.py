@@ -0,0 +1,45 @@
+"""Add tag_count and a covering tag -> photo index
+
+Revision ID: e9f2c6b4a873
+Revises: c5a9e3d7f214
+Create Date: 2026-10-18 22:14:05.631288
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9f2c6b4a873'
+down_revision = 'c5a9e3d7f214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tag_count',
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('name_lower', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('owner_id', 'name_lower')
+    )
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_tag_owner_name')
+        batch_op.create_index('ix_tag_owner_name_photo', ['owner_id', 'name_lower', 'photo_id'], unique=False)
+
+    # each key's count, spelled as its most recently added tag
+    op.execute(
+        "INSERT INTO tag_count (owner_id, name_lower, name, count) "
+        "SELECT t.owner_id, t.name_lower, t.name, latest.n FROM tag t JOIN ("
+        "  SELECT max(id) AS id, count(*) AS n FROM tag GROUP BY owner_id, name_lower"
+        ") latest ON latest.id = t.id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('tag', schema=None) as batch_op:
+        batch_op.drop_index('ix_tag_owner_name_photo')
+        batch_op.create_index('ix_tag_owner_name', ['owner_id', 'name_lower'], unique=False)
+    op.drop_table('tag_count')
@@ -0,0 +1,32 @@
+"""Add perceptual hash and band index columns to photo
+
+Revision ID: f1e8a4b2c937
+Revises: d4c7b1e9f362
+Create Date: 2026-10-18 20:05:33.842017
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1e8a4b2c937'
+down_revision = 'd4c7b1e9f362'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phash', sa.BigInteger(), nullable=True))
+        for i in range(4):
+            batch_op.add_column(sa.Column(f'phash_b{i}', sa.Integer(), nullable=True))
+            batch_op.create_index(f'ix_photo_phash_b{i}', ['user_id', f'phash_b{i}'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('photo', schema=None) as batch_op:
+        for i in range(4):
+            batch_op.drop_index(f'ix_photo_phash_b{i}')
+            batch_op.drop_column(f'phash_b{i}')
+        batch_op.drop_column('phash')
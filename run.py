@@ -1,13 +1,14 @@
-from app import create_app, db
+from app import create_app
+from app.database import bootstrap
 
 app = create_app()
 
-# --- Ensure application context before accessing the database ---
-with app.app_context():
-    from app.models import User, SharedAccess, Photo, Comment  # <-- your models
-    db.create_all()
-    print("✅ Database checked/created successfully.")
-
 if __name__ == "__main__":
+    # a fresh checkout gets its schema here; existing databases are migrated
+    # with `flask --app run db upgrade`, which create_all() would get in the
+    # way of if it ran on import
+    with app.app_context():
+        if bootstrap():
+            print("✅ Database created.")
     # Match v3 behavior (host="0.0.0.0", debug=True) while preserving v4 setup
     app.run(host="0.0.0.0", debug=True)